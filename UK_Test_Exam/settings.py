@@ -140,6 +140,53 @@ DATABASES = {
 #         sudo systemctl start postgresql  
 
 
+# Local-memory cache per worker; point this at Redis/Memcached to share
+# the content cache between workers. The content version itself is kept in
+# the database, so workers agree on it either way (CONTENT_VERSION_TTL).
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'uk-test-exam',
+    }
+}
+
+# Seconds a versioned content-cache entry lives (see main/content_cache.py)
+CONTENT_CACHE_TIMEOUT = 60 * 60
+
+# Seconds a worker holds the content version read from the database before
+# reading it again, i.e. how long another worker's edit may go unseen
+CONTENT_VERSION_TTL = 5
+
+# Rebuild lesson page snapshots in a background thread (see api/snapshots.py)
+LESSON_SNAPSHOT_ASYNC = True
+
+# Seconds a per-worker hot response lives (see api/hotcache.py)
+HOT_CACHE_TIMEOUT = 60
+
+# Where mock test answers keep their selected options: "mask" (packed into
+# selected_mask) or "m2m" (also the selected_choices table, see api/grading.py)
+ANSWER_SELECTION_STORAGE = "mask"
+
+# Where answers of running mock tests live: "db" (written on every answer) or
+# "cache" (kept in MOCK_SESSION_CACHE and written on finish/submit or by the
+# flush_mock_sessions command, see api/live_sessions.py). "cache" needs a cache
+# shared by all workers (Redis/Memcached), not the local-memory default.
+MOCK_SESSION_STATE = "db"
+MOCK_SESSION_CACHE = "default"
+MOCK_SESSION_STATE_TIMEOUT = 6 * 60 * 60
+
+# Ready-made mock test papers kept per worker (0 disables the pool) and
+# whether it is refilled in a background thread (see api/paper_pool.py)
+MOCK_PAPER_POOL_SIZE = 20
+MOCK_PAPER_POOL_ASYNC = True
+
+# Picks mock test questions within chapters (see api/selection.py):
+# "api.selection.UniformSelection" or "api.selection.RecencySelection", which
+# prefers questions not seen in the user's last MOCK_EXPOSURE_SESSIONS tests
+MOCK_SELECTION_ENGINE = "api.selection.UniformSelection"
+MOCK_EXPOSURE_SESSIONS = 3
+
+
 
 
 REST_FRAMEWORK = {
@@ -0,0 +1,167 @@
+"""
+Offline study bundles: one gzip-compressed JSON document per chapter with
+its lessons, lesson contents, glossaries and practice questions, plus a
+manifest of sha256 hashes of the media files they reference.
+
+Bundles are content-addressed (the digest of the JSON is part of the file
+name and the ETag) and only rebuilt when their chapter is marked stale by
+the signals in api.signals.
+"""
+import gzip
+import hashlib
+import json
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db.models import Prefetch
+from rest_framework.utils.encoders import JSONEncoder
+
+from main.models import Chapter, ChapterBundle, Lesson, LessonContent, Glossary, Question, QuestionOption, QuestionGlossary
+from .serializers import LessonContentModelSerializer, QuestionSerializer
+
+BUNDLE_FORMAT = 1
+
+
+def mark_chapters_stale(chapter_ids):
+    chapter_ids = {chapter_id for chapter_id in chapter_ids if chapter_id is not None}
+    if chapter_ids:
+        ChapterBundle.objects.filter(chapter_id__in=chapter_ids).update(is_stale=True)
+
+
+def file_sha256(name):
+    digest = hashlib.sha256()
+    with default_storage.open(name, "rb") as fh:
+        for chunk in iter(lambda: fh.read(64 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def media_manifest(names, previous=None):
+    """
+    {storage name: sha256}. Uploaded files get unique names, so hashes from
+    the previous manifest are reused for names that are still referenced.
+    """
+    previous = previous or {}
+    manifest = {}
+    for name in sorted(set(names)):
+        if name in previous:
+            manifest[name] = previous[name]
+        elif default_storage.exists(name):
+            manifest[name] = file_sha256(name)
+        else:
+            manifest[name] = None
+    return manifest
+
+
+def build_chapter_payload(chapter, previous_manifest=None):
+    lessons = list(
+        Lesson.objects
+        .filter(chapter=chapter)
+        .order_by('id')
+        .prefetch_related(
+            Prefetch(
+                'lessoncontent_set',
+                queryset=LessonContent.objects.order_by('id').prefetch_related(
+                    Prefetch('glossaries', queryset=Glossary.objects.order_by('id'))
+                ),
+            )
+        )
+    )
+    questions = list(
+        Question.objects
+        .filter(chapter=chapter, type="practice")
+        .order_by('id')
+        .prefetch_related(
+            Prefetch("options", queryset=QuestionOption.objects.order_by("id")),
+            Prefetch("glossary", queryset=QuestionGlossary.objects.order_by("id")),
+        )
+    )
+
+    media = []
+    lesson_data = []
+    for lesson in lessons:
+        lesson.chapter = chapter
+        contents = list(lesson.lessoncontent_set.all())
+        for content in contents:
+            content.lesson = lesson
+            if content.image:
+                media.append(content.image.name)
+        lesson_data.append({
+            'id': lesson.id,
+            'name': lesson.name,
+            'title': lesson.title,
+            'created': lesson.created,
+            'contents': LessonContentModelSerializer(contents, many=True).data,
+        })
+
+    media.extend(q.image.name for q in questions if q.image)
+
+    return {
+        'format': BUNDLE_FORMAT,
+        'chapter': {
+            'id': chapter.id,
+            'name': chapter.name,
+            'description': chapter.description,
+            'created': chapter.created,
+        },
+        'lessons': lesson_data,
+        'questions': QuestionSerializer(questions, many=True).data,
+        'media': media_manifest(media, previous_manifest),
+    }
+
+
+def _read_previous_manifest(bundle):
+    if not bundle.file:
+        return None
+    try:
+        with bundle.file.open("rb") as fh:
+            return json.loads(gzip.decompress(fh.read()))['media']
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def build_chapter_bundle(chapter, force=False):
+    """
+    Returns the up-to-date ChapterBundle of the chapter, rebuilding it only
+    if it is missing, stale or force is set.
+    """
+    bundle, _ = ChapterBundle.objects.get_or_create(chapter=chapter)
+    if bundle.file and not bundle.is_stale and not force:
+        return bundle
+
+    # Cleared before reading so edits made while building mark it stale again
+    ChapterBundle.objects.filter(pk=bundle.pk).update(is_stale=False)
+
+    payload = build_chapter_payload(chapter, _read_previous_manifest(bundle))
+    raw = json.dumps(payload, cls=JSONEncoder, ensure_ascii=False, separators=(',', ':'), sort_keys=True).encode('utf-8')
+    digest = hashlib.sha256(raw).hexdigest()
+
+    if digest != bundle.digest or not bundle.file:
+        old_name = bundle.file.name if bundle.file else None
+        compressed = gzip.compress(raw, mtime=0)
+        bundle.file.save(f"chapter-{chapter.id}-{digest}.json.gz", ContentFile(compressed), save=False)
+        bundle.digest = digest
+        bundle.size = len(compressed)
+        if old_name and old_name != bundle.file.name:
+            default_storage.delete(old_name)
+
+    bundle.save(update_fields=['digest', 'file', 'size', 'built_at'])
+    bundle.refresh_from_db(fields=['is_stale'])
+    return bundle
+
+
+def build_stale_bundles(chapter_ids=None, force=False):
+    """
+    Rebuilds the missing or stale bundles. Returns [(chapter, bundle, rebuilt)].
+    """
+    chapters = Chapter.objects.order_by('id').select_related('bundle')
+    if chapter_ids:
+        chapters = chapters.filter(id__in=chapter_ids)
+
+    results = []
+    for chapter in chapters:
+        existing = getattr(chapter, 'bundle', None)
+        rebuilt = force or existing is None or existing.is_stale or not existing.file
+        bundle = build_chapter_bundle(chapter, force=force) if rebuilt else existing
+        results.append((chapter, bundle, rebuilt))
+    return results
@@ -0,0 +1,93 @@
+from collections import defaultdict
+
+from django.db.models import Count, Q
+
+from main.models import Chapter, ChapterProgress, Lesson, LessonProgress
+from main.progress import progress_state
+
+
+def lesson_progress_state(user):
+    return progress_state(LessonProgress, user)
+
+
+def completed_lessons_by_chapter(user):
+    """
+    Returns {chapter_id: number of lessons the user has fully completed}
+    using a single grouped query.
+    """
+    rows = (
+        LessonProgress.objects
+        .filter(user=user, completion_percentage=100.0)
+        .values('lesson__chapter_id')
+        .annotate(completed=Count('id'))
+        .order_by()
+    )
+    return {row['lesson__chapter_id']: row['completed'] for row in rows}
+
+
+def build_chapter_catalog(user=None):
+    """
+    Builds the payload of ChapterListView in a fixed number of queries:
+    one for the chapters (with annotated lesson counts), one for the lesson
+    names and, for logged-in users, one grouped fetch of completed lessons.
+    """
+    chapters = (
+        Chapter.objects
+        .annotate(lesson_count=Count('lesson'))
+        .order_by('id')
+    )
+
+    lesson_names = defaultdict(list)
+    for chapter_id, name in Lesson.objects.order_by('chapter_id', 'id').values_list('chapter_id', 'name'):
+        lesson_names[chapter_id].append(str(name))
+
+    completed = completed_lessons_by_chapter(user) if user is not None else None
+
+    data = []
+    for chapter in chapters:
+        chapter_data = {
+            'chapter_id': chapter.id,
+            'name': chapter.name,
+            'description': chapter.description,
+            'created': chapter.created,
+            'lessons': lesson_names.get(chapter.id, []),
+        }
+
+        if completed is not None:
+            total_lessons = chapter.lesson_count
+            completed_lessons = completed.get(chapter.id, 0)
+            chapter_completion = (completed_lessons / total_lessons * 100) if total_lessons > 0 else 0.0
+            chapter_data['completion_percentage'] = round(chapter_completion, 2)
+
+        data.append(chapter_data)
+
+    return data
+
+
+def build_practice_chapters():
+    """
+    Builds the shared part of PracticeChapterList with one query: the
+    chapters with their practice question counts annotated.
+    """
+    chapters = (
+        Chapter.objects
+        .annotate(total_questions=Count('questions', filter=Q(questions__type="practice")))
+        .order_by('created')
+    )
+    return [
+        {
+            'id': chapter.id,
+            'name': chapter.name,
+            'description': chapter.description,
+            'total_questions': chapter.total_questions,
+        }
+        for chapter in chapters
+    ]
+
+
+def practice_completion_by_chapter(user):
+    """
+    Returns {chapter_id: completion_percentage} of the user's practice
+    progress using a single query.
+    """
+    return dict(ChapterProgress.objects.filter(user=user).values_list('chapter_id', 'completion_percentage'))
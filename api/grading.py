@@ -0,0 +1,271 @@
+"""
+Answer keys for grading mock test and practice answers in memory.
+
+Each question's key holds two bitsets over its options: the valid options
+and the correct ones. Bit ``n`` stands for the question's ``n``-th option
+in id order, the same positions used by the selected_mask column of mock
+test answers. Keys are loaded in bulk (one query for all the questions of a
+submission that are not cached yet) and kept per process for the current
+content version, which QuestionOption and Question changes bump (see
+main.signals and main.content_cache).
+"""
+import threading
+from bisect import bisect_left
+from collections import namedtuple
+
+from django.conf import settings
+from django.db.models import F
+
+from main.content_cache import get_content_version
+from main.models import QuestionOption
+
+_keys = {}
+_keys_version = None
+_lock = threading.Lock()
+
+
+class AnswerError(Exception):
+    """
+    A single answer that cannot be recorded; the message is shown to the
+    client.
+    """
+
+
+class AnswerKey(namedtuple("AnswerKey", ["option_ids", "valid", "correct"])):
+    __slots__ = ()
+
+    def mask(self, option_ids):
+        """
+        Bitset of the selected option ids, or None if any of them is not
+        an option of the question.
+        """
+        mask = 0
+        for option_id in option_ids:
+            if type(option_id) is not int:
+                return None
+            position = bisect_left(self.option_ids, option_id)
+            if position == len(self.option_ids) or self.option_ids[position] != option_id:
+                return None
+            mask |= 1 << position
+        return mask
+
+    def grade(self, option_ids):
+        """
+        None if the selection holds an invalid option, else whether it is
+        exactly the set of correct options.
+        """
+        mask = self.mask(option_ids)
+        if mask is None:
+            return None
+        return mask == self.correct
+
+    def ids(self, mask):
+        """
+        Option ids of a bitset, in id order.
+        """
+        return [option_id for position, option_id in enumerate(self.option_ids) if mask >> position & 1]
+
+    @property
+    def correct_ids(self):
+        return self.ids(self.correct)
+
+
+EMPTY_KEY = AnswerKey((), 0, 0)
+
+
+def load_answer_keys(question_ids):
+    """
+    Builds the keys of the given questions from a single query.
+    """
+    options = {}
+    rows = (
+        QuestionOption.objects
+        .filter(question_id__in=question_ids)
+        .order_by("question_id", "id")
+        .values_list("question_id", "id", "is_correct")
+    )
+    for question_id, option_id, is_correct in rows:
+        options.setdefault(question_id, []).append((option_id, is_correct))
+
+    keys = {}
+    for question_id in question_ids:
+        question_options = options.get(question_id, [])
+        correct = 0
+        for position, (_, is_correct) in enumerate(question_options):
+            if is_correct:
+                correct |= 1 << position
+        keys[question_id] = AnswerKey(
+            tuple(option_id for option_id, _ in question_options),
+            (1 << len(question_options)) - 1,
+            correct,
+        )
+    return keys
+
+
+def get_answer_keys(question_ids):
+    """
+    Returns {question_id: AnswerKey}; questions without options get a key
+    with no valid options.
+    """
+    global _keys, _keys_version
+
+    question_ids = {question_id for question_id in question_ids if type(question_id) is int}
+    version = get_content_version()
+    with _lock:
+        if _keys_version != version:
+            _keys, _keys_version = {}, version
+        keys = _keys
+
+    found = {question_id: keys[question_id] for question_id in question_ids if question_id in keys}
+    missing = [question_id for question_id in question_ids if question_id not in found]
+    if missing:
+        loaded = load_answer_keys(missing)
+        found.update(loaded)
+        with _lock:
+            if _keys_version == version:
+                _keys.update(loaded)
+    return found
+
+
+def clear_answer_keys():
+    global _keys, _keys_version
+    with _lock:
+        _keys, _keys_version = {}, None
+
+
+def selections_in_m2m():
+    """
+    ANSWER_SELECTION_STORAGE = "mask" (default) keeps the selected options
+    of mock test answers only in selected_mask; "m2m" also writes the
+    selected_choices through table and reads from it.
+    """
+    return getattr(settings, "ANSWER_SELECTION_STORAGE", "mask") == "m2m"
+
+
+def save_selection(answer, key, choice_ids):
+    """
+    Stores the (already validated) selection on the answer. The caller
+    saves selected_mask.
+    """
+    answer.selected_mask = key.mask(choice_ids)
+    if selections_in_m2m():
+        answer.selected_choices.set(choice_ids)
+
+
+def selected_option_ids(answer, key):
+    """
+    Selected option ids of an answer, read from the configured storage
+    (selected_choices should be prefetched in "m2m" mode).
+    """
+    if selections_in_m2m():
+        return [option.id for option in answer.selected_choices.all()]
+    return key.ids(answer.selected_mask)
+
+
+def grade_submission(answer_model, session, items):
+    """
+    Grades a full submission of a mock test session:
+
+        [{"question_id": 15, "selected_options": [42, 43]}, ...]
+
+    Reads all of the session's answers in one query and grades them
+    against the answer keys in memory. Items that are malformed, not part
+    of the session or that select an option of another question are
+    skipped; for repeated questions the last item wins. Then writes
+    is_correct and selected_mask with one bulk_update (plus one delete and
+    one bulk_create on the through table in "m2m" mode). Call it inside
+    the transaction that also finalizes the session.
+
+    Returns (answers, graded): every answer of the session and the ones
+    graded from this submission.
+    """
+    answers = list(answer_model.objects.filter(session=session))
+    by_question = {answer.question_id: answer for answer in answers}
+    keys = get_answer_keys(by_question)
+
+    selections = {}
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        question_id = item.get('question_id')
+        choice_ids = item.get('selected_options', [])
+        if question_id is None or not isinstance(choice_ids, list):
+            continue
+        try:
+            answer = by_question.get(int(question_id))
+        except (TypeError, ValueError):
+            continue
+        if answer is None:
+            continue
+
+        key = keys[answer.question_id]
+        mask = key.mask(choice_ids)
+        if mask is None:
+            continue
+        answer.is_correct = mask == key.correct
+        answer.selected_mask = mask
+        selections[answer.pk] = (answer, set(choice_ids))
+
+    graded = [answer for answer, _ in selections.values()]
+    if graded:
+        answer_model.objects.bulk_update(graded, ['is_correct', 'selected_mask'])
+
+    if graded and selections_in_m2m():
+        write_selected_choices(answer_model, {
+            answer_pk: choice_ids for answer_pk, (_, choice_ids) in selections.items()
+        })
+
+    return answers, graded
+
+
+def write_selected_choices(answer_model, selections):
+    """
+    Replaces the selected_choices of many answers ({answer_pk: option ids})
+    with one delete and one bulk_create on the through table.
+    """
+    field = answer_model._meta.get_field('selected_choices')
+    through = field.remote_field.through
+    source = f"{field.m2m_field_name()}_id"
+    target = f"{field.m2m_reverse_field_name()}_id"
+
+    through.objects.filter(**{f"{source}__in": list(selections)}).delete()
+    through.objects.bulk_create([
+        through(**{source: answer_pk, target: option_id})
+        for answer_pk, choice_ids in selections.items()
+        for option_id in choice_ids
+    ])
+
+
+def remove_option_bit(mask, position):
+    """
+    The mask with the bit of a deleted option removed and the bits of the
+    later options shifted down to their new positions.
+    """
+    return mask & ((1 << position) - 1) | (mask >> (position + 1)) << position
+
+
+def remove_option_bits(mask, positions):
+    """
+    remove_option_bit() for several options deleted together, their
+    positions taken before the delete. The highest goes first so the
+    lower positions still point at the right bits.
+    """
+    for position in sorted(positions, reverse=True):
+        mask = remove_option_bit(mask, position)
+    return mask
+
+
+def shift_selected_masks(answer_model, question_id, positions):
+    """
+    Rewrites the stored selected_mask of every answer to a question whose
+    options at ``positions`` were deleted (see remove_option_bits), with
+    one UPDATE per position. Masks with no bit at or above a position are
+    unchanged by it.
+    """
+    for position in sorted(positions, reverse=True):
+        answer_model.objects.filter(question_id=question_id, selected_mask__gte=1 << position).update(
+            selected_mask=F('selected_mask').bitand((1 << position) - 1).bitor(
+                F('selected_mask').bitrightshift(position + 1).bitleftshift(position)
+            )
+        )
+
@@ -0,0 +1,98 @@
+"""
+Per-worker read-through cache for the rendered JSON of the hottest,
+almost-static endpoints (home page and subscription plans).
+
+Entries live in process memory for HOT_CACHE_TIMEOUT seconds and are
+evicted by the signals in api.signals when the underlying table changes.
+They are also rebuilt once the content version (main.content_cache)
+moves, so a worker that did not handle an edit never sends an older body
+than the ETag it computes from that version (main.conditional). Changes that do not bump the
+content version (subscription plans) reach other workers once their copy
+expires, so keep the timeout short.
+"""
+import json
+import threading
+import time
+
+from django.conf import settings
+from django.http import HttpResponse
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+
+from main.content_cache import get_content_version
+
+_entries = {}  # name -> (expires_at, generation, content version, (status_code, body))
+_generations = {}
+_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+
+def _timeout():
+    return getattr(settings, "HOT_CACHE_TIMEOUT", 60)
+
+
+def get_or_build(name, builder):
+    """
+    Returns the cached (status_code, body bytes) for name, calling
+    builder() on a miss or after expiry.
+    """
+    version = get_content_version()
+    entry = _entries.get(name)
+    if (
+        entry is not None and entry[0] > time.monotonic()
+        and entry[1] == _generations.get(name, 0) and entry[2] == version
+    ):
+        _stats["hits"] += 1
+        return entry[3]
+
+    _stats["misses"] += 1
+    generation = _generations.get(name, 0)
+    value = builder()
+    with _lock:
+        # Skip the store if the entry was evicted while building
+        if _generations.get(name, 0) == generation:
+            _entries[name] = (time.monotonic() + _timeout(), generation, version, value)
+    return value
+
+
+def render(data, status_code):
+    return status_code, JSONRenderer().render(data)
+
+
+def evict(*names):
+    with _lock:
+        for name in names:
+            _generations[name] = _generations.get(name, 0) + 1
+            if _entries.pop(name, None) is not None:
+                _stats["evictions"] += 1
+
+
+def cached_response(request, cached):
+    """
+    Sends the cached bytes as they are; other renderers (browsable API)
+    get a regular Response.
+    """
+    status_code, body = cached
+    if request.accepted_renderer.format != 'json':
+        return Response(json.loads(body), status=status_code)
+    return HttpResponse(body, content_type='application/json', status=status_code)
+
+
+def hot_cache_stats():
+    hits, misses = _stats["hits"], _stats["misses"]
+    total = hits + misses
+    return {
+        "entries": len(_entries),
+        "hits": hits,
+        "misses": misses,
+        "evictions": _stats["evictions"],
+        "hit_ratio": round(hits / total, 4) if total else 0.0,
+    }
+
+
+def reset_hot_cache():
+    with _lock:
+        _entries.clear()
+        _generations.clear()
+        for key in _stats:
+            _stats[key] = 0
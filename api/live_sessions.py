@@ -0,0 +1,175 @@
+"""
+Cache-backed state of running mock test sessions.
+
+With MOCK_SESSION_STATE = "cache" the answer actions of both mock test
+viewsets record answers in MOCK_SESSION_CACHE instead of the database: the
+state of a session is one cache entry holding its owner and
+{question_id: (selected_mask, is_correct)}, loaded from the database (two
+queries, plus one for the answer keys of the paper) the first time the
+session is touched. Answers changed since the
+last write are tracked in the entry and written back with one bulk_update
+when the session is finished or submitted, when it is retrieved, and by the
+flush_mock_sessions command, which should run every few minutes so a cache
+restart loses little.
+
+The cache must be shared by every worker (Redis/Memcached); with the
+local-memory default, answers recorded by one worker are invisible to the
+others. One client answers a session at a time, so entries are replaced
+without locking.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils import timezone
+
+from main.models import MockTestSession, MockTestAnswer, FreeMockTestSession, FreeMockTestAnswer
+from .grading import get_answer_keys, selections_in_m2m, write_selected_choices, remove_option_bits, AnswerError
+
+SESSION_MODELS = {
+    "mock": (MockTestSession, MockTestAnswer),
+    "free": (FreeMockTestSession, FreeMockTestAnswer),
+}
+
+
+def live_state_enabled():
+    return getattr(settings, "MOCK_SESSION_STATE", "db") == "cache"
+
+
+def _cache():
+    return caches[getattr(settings, "MOCK_SESSION_CACHE", "default")]
+
+
+def _timeout():
+    return getattr(settings, "MOCK_SESSION_STATE_TIMEOUT", 6 * 60 * 60)
+
+
+def _key(kind, session_id):
+    return f"mock-session:{kind}:{session_id}"
+
+
+def load_state(kind, session_id):
+    """
+    Returns the cached state of a session, loading it from the database on
+    a miss, or None if the session does not exist.
+    """
+    key = _key(kind, session_id)
+    state = _cache().get(key)
+    if state is not None:
+        return state
+
+    session_model, answer_model = SESSION_MODELS[kind]
+    user_id = session_model.objects.filter(pk=session_id).values_list('user_id', flat=True).first()
+    if user_id is None:
+        return None
+    rows = answer_model.objects.filter(session_id=session_id).values_list('question_id', 'selected_mask', 'is_correct')
+    state = {
+        "user_id": user_id,
+        "answers": {question_id: (mask, is_correct) for question_id, mask, is_correct in rows},
+        "dirty": set(),
+    }
+    _cache().set(key, state, _timeout())
+    get_answer_keys(state["answers"])  # warm the keys of the whole paper in one query
+    return state
+
+
+def record_answer(kind, session_id, user, question_id, choice_ids):
+    """
+    Grades an answer against the answer keys and records it in the
+    session's cached state. Returns whether it is correct.
+
+    Raises session_model.DoesNotExist if the session is not the user's and
+    AnswerError for a question outside the session or invalid choices.
+    """
+    state = load_state(kind, session_id)
+    if state is None or state["user_id"] != user.pk:
+        raise SESSION_MODELS[kind][0].DoesNotExist
+    try:
+        question_id = int(question_id)
+    except (TypeError, ValueError):
+        raise AnswerError('Question not found in this session.')
+    if question_id not in state["answers"]:
+        raise AnswerError('Question not found in this session.')
+
+    key = get_answer_keys([question_id])[question_id]
+    mask = key.mask(choice_ids)
+    if mask is None:
+        raise AnswerError('One or more choices are invalid for this question.')
+
+    is_correct = mask == key.correct
+    state["answers"][question_id] = (mask, is_correct)
+    state["dirty"].add(question_id)
+    _cache().set(_key(kind, session_id), state, _timeout())
+    return is_correct
+
+
+def flush_state(kind, session_id):
+    """
+    Writes the answers changed since the last flush to the database.
+    Returns how many were written.
+    """
+    key = _key(kind, session_id)
+    state = _cache().get(key)
+    if state is None or not state["dirty"]:
+        return 0
+
+    _, answer_model = SESSION_MODELS[kind]
+    flushed = {question_id: state["answers"][question_id] for question_id in state["dirty"]}
+    answers = list(answer_model.objects.filter(session_id=session_id, question_id__in=flushed))
+    for answer in answers:
+        answer.selected_mask, answer.is_correct = flushed[answer.question_id]
+    answer_model.objects.bulk_update(answers, ['selected_mask', 'is_correct'])
+
+    if selections_in_m2m():
+        keys = get_answer_keys(flushed)
+        write_selected_choices(answer_model, {
+            answer.pk: keys[answer.question_id].ids(answer.selected_mask) for answer in answers
+        })
+
+    # Re-read so answers recorded while writing stay dirty
+    current = _cache().get(key)
+    if current is not None:
+        current["dirty"] = {
+            question_id for question_id in current["dirty"]
+            if current["answers"][question_id] != flushed.get(question_id)
+        }
+        _cache().set(key, current, _timeout())
+    return len(answers)
+
+
+def shift_cached_masks(kind, question_id, positions):
+    """
+    Applies grading.remove_option_bits to the cached answers to a question
+    of the running sessions that hold one, after options were deleted.
+    """
+    _, answer_model = SESSION_MODELS[kind]
+    running = answer_model.objects.filter(question_id=question_id, session__finished_at__isnull=True)
+    for session_id in running.values_list('session_id', flat=True):
+        key = _key(kind, session_id)
+        state = _cache().get(key)
+        if state is None or question_id not in state["answers"]:
+            continue
+        mask, is_correct = state["answers"][question_id]
+        state["answers"][question_id] = (remove_option_bits(mask, positions), is_correct)
+        _cache().set(key, state, _timeout())
+
+
+def discard_state(kind, session_id):
+    _cache().delete(_key(kind, session_id))
+
+
+def flush_running_sessions():
+    """
+    Flushes every unfinished session started within the state timeout.
+    Returns (sessions flushed, answers written).
+    """
+    since = timezone.now() - timedelta(seconds=_timeout())
+    sessions = written = 0
+    for kind, (session_model, _) in SESSION_MODELS.items():
+        running = session_model.objects.filter(finished_at__isnull=True, started_at__gte=since).values_list('pk', flat=True)
+        for session_id in running.iterator():
+            count = flush_state(kind, session_id)
+            if count:
+                sessions += 1
+                written += count
+    return sessions, written
@@ -0,0 +1,57 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from main.models import Question
+from api.grading import get_answer_keys, clear_answer_keys
+
+
+def grade_with_queries(question, option_ids):
+    # What the views did before answer keys: two option queries per question
+    valid_choice_ids = set(question.options.values_list('id', flat=True))
+    if not set(option_ids).issubset(valid_choice_ids):
+        return None
+    correct_ids = set(question.options.filter(is_correct=True).values_list('id', flat=True))
+    return set(option_ids) == correct_ids
+
+
+class Command(BaseCommand):
+    help = "Compare grading throughput of per-question option queries with the in-memory answer keys. Read-only."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--submissions", type=int, default=50, help="Number of simulated submissions (default 50).")
+        parser.add_argument("--size", type=int, default=24, help="Questions per submission (default 24).")
+
+    def handle(self, *args, **options):
+        questions = list(Question.objects.filter(options__isnull=False).distinct().prefetch_related('options'))
+        if len(questions) < options["size"]:
+            raise CommandError(f"Need at least {options['size']} questions with options, found {len(questions)}.")
+
+        submissions = []
+        for _ in range(options["submissions"]):
+            paper = random.sample(questions, options["size"])
+            submissions.append([
+                (q, random.sample([o.id for o in q.options.all()], k=random.randint(1, len(q.options.all()))))
+                for q in paper
+            ])
+
+        start = time.perf_counter()
+        before = [[grade_with_queries(q, ids) for q, ids in submission] for submission in submissions]
+        queries_time = time.perf_counter() - start
+
+        clear_answer_keys()
+        start = time.perf_counter()
+        after = []
+        for submission in submissions:
+            keys = get_answer_keys(q.id for q, _ in submission)
+            after.append([keys[q.id].grade(ids) for q, ids in submission])
+        keys_time = time.perf_counter() - start
+
+        if before != after:
+            raise CommandError("Answer keys and option queries disagree on some answers.")
+
+        count = len(submissions)
+        self.stdout.write(f"Option queries: {count / queries_time:,.1f} submissions/s ({queries_time * 1000 / count:.2f} ms each)")
+        self.stdout.write(f"Answer keys:    {count / keys_time:,.1f} submissions/s ({keys_time * 1000 / count:.2f} ms each, cold keys included)")
+        self.stdout.write(self.style.SUCCESS(f"Speed-up: {queries_time / keys_time:.1f}x"))
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from api.bundles import build_stale_bundles
+
+
+class Command(BaseCommand):
+    help = "Build the offline study bundles of chapters whose content changed since the last build."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chapter", type=int, action="append", dest="chapters", help="Only this chapter id (repeatable).")
+        parser.add_argument("--force", action="store_true", help="Rebuild even if the bundle is up to date.")
+
+    def handle(self, *args, **options):
+        results = build_stale_bundles(options["chapters"], force=options["force"])
+
+        for chapter, bundle, rebuilt in results:
+            state = "built" if rebuilt else "up to date"
+            self.stdout.write(f"Chapter {chapter.id} ({chapter.name}): {state} {bundle.digest[:12]} {bundle.size} bytes")
+
+        built = sum(1 for _, _, rebuilt in results if rebuilt)
+        self.stdout.write(self.style.SUCCESS(f"{built} of {len(results)} bundles rebuilt."))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from api.live_sessions import live_state_enabled, flush_running_sessions
+
+
+class Command(BaseCommand):
+    help = "Write the cached answers of running mock tests to the database. Run it every few minutes (e.g. from cron) when MOCK_SESSION_STATE = \"cache\"."
+
+    def handle(self, *args, **options):
+        if not live_state_enabled():
+            self.stdout.write("MOCK_SESSION_STATE is not \"cache\", nothing to flush.")
+            return
+        sessions, written = flush_running_sessions()
+        self.stdout.write(self.style.SUCCESS(f"{written} answers of {sessions} sessions written."))
@@ -0,0 +1,22 @@
+from rest_framework.pagination import CursorPagination
+
+
+class ContentCursorPagination(CursorPagination):
+    """
+    Keyset pagination on ``id`` for lesson and guide content pages. The cursor
+    is opaque; ``?cursor=`` (empty) starts from the first page.
+    """
+    page_size = 10
+    ordering = 'id'
+
+
+class HistoryCursorPagination(CursorPagination):
+    """
+    Keyset pagination of finished mock test sessions, newest first.
+    """
+    page_size = 20
+    ordering = ('-finished_at', '-id')
+
+
+def is_cursor_request(request):
+    return ContentCursorPagination.cursor_query_param in request.query_params
@@ -0,0 +1,147 @@
+"""
+Per-worker pool of ready-made mock test papers for MockTestViewSet.start.
+
+A paper is a sampled allocation of questions (see api.question_pool) stored
+with its rendered questions (serializers.question_for_test_data), so start
+only has to create the session rows. The pool holds up to
+MOCK_PAPER_POOL_SIZE papers (0 disables it) for the current content version
+(see main.content_cache): it is emptied when the version changes and
+refilled in a background thread once it drops below half (inline when
+MOCK_PAPER_POOL_ASYNC is False).
+
+Papers are rendered without a request, so image URLs are made absolute
+when a paper is taken.
+"""
+import logging
+import threading
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connection
+
+from main.content_cache import get_content_version
+from main.models import Question
+from .question_pool import sample_paper, NotEnoughQuestions
+from .serializers import question_for_test_data
+
+logger = logging.getLogger(__name__)
+
+PAPER_SIZE = 24
+
+Paper = namedtuple("Paper", ["chapter_counts", "question_ids", "questions"])
+
+_papers = deque()
+_version = None
+_refilling = False
+_lock = threading.Lock()
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="mock-papers")
+
+
+def _pool_size():
+    return getattr(settings, "MOCK_PAPER_POOL_SIZE", 20)
+
+
+def build_paper():
+    chapter_counts, questions = sample_paper(PAPER_SIZE)
+    return Paper(
+        chapter_counts,
+        [question.id for question in questions],
+        [question_for_test_data(question) for question in questions],
+    )
+
+
+def refill_papers():
+    """
+    Tops the pool up to MOCK_PAPER_POOL_SIZE papers of the current
+    content version. Returns how many papers were added.
+    """
+    global _version
+    version = get_content_version()
+    with _lock:
+        if _version != version:
+            _papers.clear()
+            _version = version
+    added = 0
+    while True:
+        with _lock:
+            if _version != version or len(_papers) >= _pool_size():
+                return added
+        try:
+            paper = build_paper()
+        except NotEnoughQuestions:
+            return added
+        with _lock:
+            if _version != version:
+                return added
+            _papers.append(paper)
+        added += 1
+
+
+def _refill():
+    global _refilling
+    try:
+        refill_papers()
+    except Exception:
+        logger.exception("Refilling the mock test paper pool failed")
+    finally:
+        _refilling = False
+        connection.close()
+
+
+def _schedule_refill():
+    global _refilling
+    with _lock:
+        if _refilling or len(_papers) >= _pool_size() // 2:
+            return
+        _refilling = True
+
+    if getattr(settings, "MOCK_PAPER_POOL_ASYNC", True):
+        _executor.submit(_refill)
+    else:
+        try:
+            refill_papers()
+        finally:
+            _refilling = False
+
+
+def take_paper(request):
+    """
+    Pops a paper for the current content version, or returns None if the
+    pool is disabled, empty or holds a question deleted meanwhile (the
+    caller then samples a paper itself). Schedules a refill when low.
+    """
+    global _version
+    if _pool_size() <= 0:
+        return None
+
+    version = get_content_version()
+    with _lock:
+        if _version != version:
+            _papers.clear()
+            _version = version
+        paper = _papers.popleft() if _papers else None
+    _schedule_refill()
+    if paper is None:
+        return None
+
+    if Question.objects.filter(id__in=paper.question_ids).count() != len(paper.question_ids):
+        # Deleted on another worker whose version bump we have not seen
+        clear_papers()
+        return None
+
+    for question in paper.questions:
+        if question["image"]:
+            question["image"] = request.build_absolute_uri(question["image"])
+    return paper
+
+
+def clear_papers():
+    global _version
+    with _lock:
+        _papers.clear()
+        _version = None
+
+
+def paper_pool_stats():
+    return {"papers": len(_papers), "version": _version}
@@ -0,0 +1,51 @@
+"""
+Streamed body of PracticeQuestionListView.
+
+A chapter's practice questions are read CHUNK_SIZE at a time (with their
+options and glossaries prefetched per chunk) and written out one question
+at a time, so memory stays flat however large the chapter is. Every piece
+is rendered with JSONRenderer, so the bytes are the same as rendering the
+whole Response at once.
+"""
+from django.db.models import Prefetch
+from rest_framework.renderers import JSONRenderer
+
+from main.models import Question, QuestionOption, QuestionGlossary
+from .serializers import question_data
+
+CHUNK_SIZE = 200
+
+
+def practice_questions(chapter_id):
+    return (
+        Question.objects
+        .filter(type="practice", chapter_id=chapter_id)
+        .order_by("id")
+        .prefetch_related(
+            Prefetch("options", queryset=QuestionOption.objects.order_by("id")),
+            Prefetch("glossary", queryset=QuestionGlossary.objects.order_by("id")),
+        )
+    )
+
+
+def iter_practice_questions(chapter_id):
+    """
+    Yields the JSON body of the practice question list in chunks:
+
+        {"success":true,"message":...,"data":{"total":N,"questions":[...]}}
+
+    The total is counted before the questions are read, so a question
+    added or removed while streaming can make it differ from the list.
+    """
+    renderer = JSONRenderer()
+    questions = practice_questions(chapter_id)
+
+    yield (
+        b'{"success":true,"message":"Practice questions retrieved successfully.","data":{"total":'
+        + renderer.render(questions.count()) + b',"questions":['
+    )
+    first = True
+    for question in questions.iterator(chunk_size=CHUNK_SIZE):
+        yield (b'' if first else b',') + renderer.render(question_data(question))
+        first = False
+    yield b']}}'
@@ -0,0 +1,155 @@
+"""
+In-process index of question ids per chapter, used by MockTestViewSet.start
+to allocate and sample a paper without loading the question bank.
+
+The index is a compact array of ids per chapter, built with one query the
+first time it is needed at a given content version. Question saves and
+deletes bump the content version (see main.signals and
+main.content_cache), so the next request rebuilds it.
+"""
+import random
+import threading
+from array import array
+
+from django.db.models import Prefetch
+
+from main.content_cache import get_content_version
+from main.models import Question, QuestionOption, QuestionGlossary
+
+_indexes = {}  # question type -> (content version, {chapter_id: array of ids})
+_lock = threading.Lock()
+
+
+def build_question_pool(question_type):
+    pool = {}
+    rows = (
+        Question.objects
+        .filter(type=question_type)
+        .order_by('chapter_id', 'id')
+        .values_list('chapter_id', 'id')
+    )
+    for chapter_id, question_id in rows:
+        pool.setdefault(chapter_id, array('q')).append(question_id)
+    return pool
+
+
+def get_question_pool(question_type="practice"):
+    """
+    Returns {chapter_id: array of question ids} for the current content
+    version, ordered by chapter id.
+    """
+    version = get_content_version()
+    entry = _indexes.get(question_type)
+    if entry is None or entry[0] != version:
+        with _lock:
+            entry = _indexes.get(question_type)
+            if entry is None or entry[0] != version:
+                entry = (version, build_question_pool(question_type))
+                _indexes[question_type] = entry
+    return entry[1]
+
+
+def invalidate_question_pool():
+    _indexes.clear()
+
+
+_layouts = {}  # id(pool) -> (pool, layout)
+
+
+def pool_layout(pool):
+    """
+    Bit positions of a pool's questions, chapter after chapter. Returns
+    (offsets, positions): {chapter_id: position of its first question} and
+    {question_id: position}. Used by the exposure bitsets of api.selection.
+    """
+    entry = _layouts.get(id(pool))
+    if entry is not None and entry[0] is pool:
+        return entry[1]
+
+    offsets, positions = {}, {}
+    for ch_id, ids in pool.items():
+        offsets[ch_id] = len(positions)
+        for question_id in ids:
+            positions[question_id] = len(positions)
+    if len(_layouts) > 8:
+        _layouts.clear()
+    _layouts[id(pool)] = (pool, (offsets, positions))
+    return offsets, positions
+
+
+def allocate_questions(chapter_sizes, total_questions):
+    """
+    Splits total_questions across chapters in proportion to their sizes:
+    floors first, then the remainder goes to the largest fractional parts.
+    """
+    total_available = sum(chapter_sizes.values())
+
+    raw_counts = {}
+    chapter_counts = {}
+    for ch_id, count in chapter_sizes.items():
+        raw = (count / total_available) * total_questions
+        raw_counts[ch_id] = raw
+        chapter_counts[ch_id] = int(raw)  # start with floor()
+
+    remainder = total_questions - sum(chapter_counts.values())
+    if remainder > 0:
+        sorted_chapters = sorted(
+            raw_counts.items(),
+            key=lambda x: (x[1] - int(x[1]), x[1]),  # fractional part, then bigger weight
+            reverse=True
+        )
+        for ch_id, _ in sorted_chapters[:remainder]:
+            chapter_counts[ch_id] += 1
+
+    return chapter_counts
+
+
+def sample_questions(pool, chapter_counts):
+    """
+    Returns the sampled question ids, chapter by chapter.
+    """
+    selected = []
+    for ch_id, count in chapter_counts.items():
+        selected.extend(random.sample(pool[ch_id], count))
+    return selected
+
+
+class NotEnoughQuestions(Exception):
+    def __init__(self, available):
+        super().__init__(available)
+        self.available = available
+
+
+def load_questions(question_ids, question_type="practice"):
+    return Question.objects.filter(id__in=question_ids, type=question_type).prefetch_related(
+        Prefetch("options", queryset=QuestionOption.objects.order_by("id")),
+        Prefetch("glossary", queryset=QuestionGlossary.objects.order_by("id")),
+    ).in_bulk()
+
+
+def sample_paper(total_questions, question_type="practice", select=sample_questions):
+    """
+    Samples a paper with the proportional-by-chapter rule and loads its
+    questions (options and glossaries prefetched). select(pool,
+    chapter_counts) picks the ids within chapters, uniformly by default.
+
+    Returns (chapter_counts, questions); raises NotEnoughQuestions.
+    """
+    for attempt in range(2):
+        pool = get_question_pool(question_type)
+        chapter_sizes = {ch_id: len(ids) for ch_id, ids in pool.items()}
+        total_available = sum(chapter_sizes.values())
+        if total_available < total_questions:
+            raise NotEnoughQuestions(total_available)
+
+        chapter_counts = allocate_questions(chapter_sizes, total_questions)
+        selected_ids = select(pool, chapter_counts)
+
+        questions_by_id = load_questions(selected_ids, question_type)
+        if len(questions_by_id) == len(selected_ids):
+            break
+        # The index predates a deletion made on another worker: rebuild and resample
+        invalidate_question_pool()
+
+    questions = [questions_by_id[q_id] for q_id in selected_ids if q_id in questions_by_id]
+    return chapter_counts, questions
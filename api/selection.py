@@ -0,0 +1,133 @@
+"""
+Selection engines that pick a mock test paper's questions within chapters.
+
+MOCK_SELECTION_ENGINE names the engine class:
+
+- UniformSelection (default) draws uniformly, like sample_questions, and
+  lets start serve papers from the shared pool (api.paper_pool).
+- RecencySelection prefers the questions a user has seen least recently:
+  never seen first, then seen before their last MOCK_EXPOSURE_SESSIONS
+  sessions, then the most recent ones, at random within each tier.
+
+A user's exposure is kept in the cache as bitsets over the positions of
+the question pool (see question_pool.pool_layout): one per recent session
+plus one of every question seen. It is rebuilt from MockTestAnswer with one
+query when missing or made for another content version, so picking a paper
+never reads the history.
+"""
+import random
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.module_loading import import_string
+
+from main.content_cache import get_content_version
+from main.models import MockTestAnswer
+from .question_pool import sample_questions, pool_layout, get_question_pool
+
+EXPOSURE_TIMEOUT = 7 * 24 * 60 * 60
+
+
+class UniformSelection:
+    per_user = False
+
+    def select(self, pool, chapter_counts, user=None):
+        return sample_questions(pool, chapter_counts)
+
+    def record(self, user, question_ids):
+        pass
+
+
+class RecencySelection:
+    per_user = True
+
+    def _sessions(self):
+        return getattr(settings, "MOCK_EXPOSURE_SESSIONS", 3)
+
+    def _key(self, user):
+        return f"mock-exposure:{user.pk}"
+
+    def build_exposure(self, user, pool, version):
+        _, positions = pool_layout(pool)
+        sessions = {}
+        rows = (
+            MockTestAnswer.objects
+            .filter(session__user_id=user.pk)
+            .order_by('session_id')
+            .values_list('session_id', 'question_id')
+        )
+        for session_id, question_id in rows:
+            position = positions.get(question_id)
+            if position is not None:
+                sessions[session_id] = sessions.get(session_id, 0) | 1 << position
+
+        seen = 0
+        for bits in sessions.values():
+            seen |= bits
+        recent = list(sessions.values())[-self._sessions():] if self._sessions() else []
+        return {"version": version, "sessions": recent, "seen": seen}
+
+    def get_exposure(self, user, pool):
+        version = get_content_version()
+        exposure = cache.get(self._key(user))
+        if exposure is None or exposure["version"] != version:
+            exposure = self.build_exposure(user, pool, version)
+            cache.set(self._key(user), exposure, EXPOSURE_TIMEOUT)
+        return exposure
+
+    def select(self, pool, chapter_counts, user=None):
+        if user is None:
+            return sample_questions(pool, chapter_counts)
+
+        exposure = self.get_exposure(user, pool)
+        recent = 0
+        for bits in exposure["sessions"]:
+            recent |= bits
+        offsets, _ = pool_layout(pool)
+
+        selected = []
+        for ch_id, count in chapter_counts.items():
+            ids = pool[ch_id]
+            size, offset = len(ids), offsets[ch_id]
+            # One character per question, lowest position first
+            seen_flags = format(exposure["seen"] >> offset & ((1 << size) - 1), f"0{size}b")[::-1]
+            recent_flags = format(recent >> offset & ((1 << size) - 1), f"0{size}b")[::-1]
+
+            tiers = ([], [], [])
+            for question_id, was_seen, was_recent in zip(ids, seen_flags, recent_flags):
+                tiers[(was_seen == "1") + (was_recent == "1")].append(question_id)
+
+            picked = []
+            for tier in tiers:
+                need = count - len(picked)
+                if need <= 0:
+                    break
+                picked.extend(tier if len(tier) <= need else random.sample(tier, need))
+            random.shuffle(picked)
+            selected.extend(picked)
+        return selected
+
+    def record(self, user, question_ids):
+        pool = get_question_pool("practice")
+        exposure = self.get_exposure(user, pool)
+        _, positions = pool_layout(pool)
+
+        bits = 0
+        for question_id in question_ids:
+            if question_id in positions:
+                bits |= 1 << positions[question_id]
+
+        exposure["seen"] |= bits
+        if self._sessions():
+            exposure["sessions"] = (exposure["sessions"] + [bits])[-self._sessions():]
+        cache.set(self._key(user), exposure, EXPOSURE_TIMEOUT)
+
+
+@lru_cache(maxsize=None)
+def _load_engine(path):
+    return import_string(path)()
+
+
+def get_selection_engine():
+    return _load_engine(getattr(settings, "MOCK_SELECTION_ENGINE", "api.selection.UniformSelection"))
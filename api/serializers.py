@@ -307,6 +307,52 @@ class QuestionForTestSerializer(serializers.ModelSerializer):
         return [opt.text for opt in obj.options.all() if opt.is_correct]
 
 
+def _question_fields(question, image):
+    # Everything after the ids, in the field order both serializers share
+    options = question.options.all()
+    return {
+        "question_text": question.question_text,
+        "image": image,
+        "multiple_answers": question.multiple_answers,
+        "options": [{"id": opt.id, "text": opt.text, "is_correct": opt.is_correct} for opt in options],
+        "correct_option_ids": [opt.id for opt in options if opt.is_correct],
+        "correct_option_texts": [opt.text for opt in options if opt.is_correct],
+        "explanation": question.explanation,
+        "glossaries": [
+            {"id": item.id, "title": item.title, "description": item.description}
+            for item in question.glossary.all()
+        ],
+    }
+
+
+def question_for_test_data(question, request=None):
+    """
+    Fast path of QuestionForTestSerializer(question).data for the mock test
+    views: the same dict, built without the per-field serializer machinery.
+    Expects options and glossary to be prefetched.
+    """
+    image = None
+    if question.image:
+        image = question.image.url
+        if request is not None:
+            image = request.build_absolute_uri(image)
+    return {"id": question.id, **_question_fields(question, image)}
+
+
+def question_data(question):
+    """
+    Fast path of QuestionSerializer(question).data for the practice views:
+    the same dict, built without the per-field serializer machinery.
+    Expects options and glossary to be prefetched.
+    """
+    return {
+        "id": question.id,
+        "chapter": question.chapter_id,
+        "type": question.type,
+        **_question_fields(question, f"/media/{question.image.name}" if question.image else None),
+    }
+
+
 class UserSerializer(serializers.ModelSerializer):
     """
     Serializer for the User model (basic details).
@@ -352,19 +398,30 @@ class MockTestAnswerSerializer(serializers.ModelSerializer):
         model = MockTestAnswer
         fields = ['question', 'selected_choice_ids']
 
-class MockTestResultSerializer(serializers.ModelSerializer):
+class SessionResultSerializer(serializers.ModelSerializer):
+    """
+    Result of a mock test session. Reads correct_count / wrong_count when
+    the session carries them (see SessionEngine.history and finish) and
+    counts the answers otherwise.
+    """
     correct = serializers.SerializerMethodField()
     wrong = serializers.SerializerMethodField()
 
-    class Meta:
-        model = MockTestSession
-        fields = ['id', 'score', 'correct', 'wrong', 'started_at', 'finished_at']
-
     def get_correct(self, obj):
+        if hasattr(obj, 'correct_count'):
+            return obj.correct_count
         return obj.answers.filter(is_correct=True).count()
 
     def get_wrong(self, obj):
+        if hasattr(obj, 'wrong_count'):
+            return obj.wrong_count
         return obj.answers.filter(is_correct=False).count()
+
+
+class MockTestResultSerializer(SessionResultSerializer):
+    class Meta:
+        model = MockTestSession
+        fields = ['id', 'score', 'correct', 'wrong', 'started_at', 'finished_at']
     
 
 class FreeStartMockTestSerializer(serializers.ModelSerializer):
@@ -380,20 +437,11 @@ class FreeMockTestAnswerSerializer(serializers.ModelSerializer):
         model = FreeMockTestAnswer
         fields = ['question', 'selected_choice_ids']
 
-class FreeMockTestResultSerializer(serializers.ModelSerializer):
-    correct = serializers.SerializerMethodField()
-    wrong = serializers.SerializerMethodField()
-
+class FreeMockTestResultSerializer(SessionResultSerializer):
     class Meta:
         model = FreeMockTestSession
         fields = ['id', 'score', 'correct', 'wrong', 'started_at', 'finished_at']
 
-    def get_correct(self, obj):
-        return obj.answers.filter(is_correct=True).count()
-
-    def get_wrong(self, obj):
-        return obj.answers.filter(is_correct=False).count()
-
 
 class CSVUploadSerializer(serializers.Serializer):
     csv_file = serializers.FileField()
\ No newline at end of file
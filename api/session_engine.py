@@ -0,0 +1,209 @@
+"""
+Shared engine of mock test and free mock test sessions.
+
+MockTestViewSet and FreeMockTestViewSet only read requests and shape
+responses. Picking questions, recording answers, grading and finishing go
+through a SessionEngine for their session and answer models, so both share
+the question index, the answer keys, bulk grading, the cache-backed live
+state (api.live_sessions) and fixed-query reads.
+"""
+import random
+from functools import partial
+
+from django.db import transaction
+from django.db.models import Count, Prefetch, Q
+from django.http import Http404
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
+
+from main.models import QuestionOption, QuestionGlossary
+from .grading import AnswerError, get_answer_keys, grade_submission, save_selection, selections_in_m2m
+from .live_sessions import SESSION_MODELS, live_state_enabled, record_answer, flush_state, discard_state
+from .paper_pool import Paper, take_paper
+from .question_pool import sample_paper
+from .selection import get_selection_engine
+from .serializers import question_for_test_data
+
+
+def sample_anywhere(pool, chapter_counts):
+    """
+    Uniform over the whole pool, ignoring the chapter allocation.
+    """
+    question_ids = [question_id for ids in pool.values() for question_id in ids]
+    return random.sample(question_ids, sum(chapter_counts.values()))
+
+
+class SessionEngine:
+    kind = None
+    question_type = None
+    # Score over every question of the session (unanswered ones count as
+    # wrong) or only over the ones graded by a submission
+    score_unanswered = True
+
+    def __init__(self):
+        self.session_model, self.answer_model = SESSION_MODELS[self.kind]
+
+    def make_paper(self, request, chapter_counts, questions):
+        serialized = [question_for_test_data(question, request) for question in questions]
+        return Paper(chapter_counts, [question.id for question in questions], serialized)
+
+    def pick_questions(self, request, total_questions):
+        """
+        Returns a Paper of random questions of question_type; raises
+        NotEnoughQuestions.
+        """
+        chapter_counts, questions = sample_paper(total_questions, self.question_type, select=sample_anywhere)
+        return self.make_paper(request, chapter_counts, questions)
+
+    def start(self, request, total_questions):
+        """
+        Picks the questions and creates the session with an empty answer
+        per question. Returns (session, paper).
+        """
+        paper = self.pick_questions(request, total_questions)
+        session = self.session_model.objects.create(user=request.user, total_questions=total_questions)
+        self.answer_model.objects.bulk_create([
+            self.answer_model(session=session, question_id=question_id) for question_id in paper.question_ids
+        ])
+        return session, paper
+
+    def get_session(self, pk, user):
+        return get_object_or_404(self.session_model, pk=pk, user=user)
+
+    def load_answers(self, session, selections=True):
+        """
+        The session's answers with their questions, options and glossaries
+        in a fixed number of queries. With selections, cached live answers
+        are written first and selected_choices is prefetched in "m2m" mode.
+        """
+        if selections and live_state_enabled():
+            flush_state(self.kind, session.pk)
+
+        answers = (
+            self.answer_model.objects
+            .filter(session=session)
+            .select_related("question")
+            .prefetch_related(
+                Prefetch("question__options", queryset=QuestionOption.objects.order_by("id")),
+                Prefetch("question__glossary", queryset=QuestionGlossary.objects.order_by("id")),
+            )
+        )
+        if selections and selections_in_m2m():
+            answers = answers.prefetch_related("selected_choices")
+        return list(answers)
+
+    def answer(self, pk, user, question_id, choice_ids):
+        """
+        Grades and records one answer of the user's session pk. Returns
+        whether it is correct; raises Http404 and AnswerError.
+        """
+        if live_state_enabled():
+            try:
+                return record_answer(self.kind, pk, user, question_id, choice_ids)
+            except self.session_model.DoesNotExist:
+                raise Http404(f"No {self.session_model._meta.object_name} matches the given query.")
+
+        try:
+            question_id = int(question_id)
+        except (TypeError, ValueError):
+            question_id = None
+        # Ownership and the answer row in one query; tell the failures apart only on a miss
+        answer = self.answer_model.objects.filter(session_id=pk, session__user=user, question_id=question_id).first()
+        if answer is None:
+            self.get_session(pk, user)
+            raise AnswerError('Question not found in this session.')
+
+        key = get_answer_keys([answer.question_id])[answer.question_id]
+        is_correct = key.grade(choice_ids)
+        if is_correct is None:
+            raise AnswerError('One or more choices are invalid for this question.')
+
+        save_selection(answer, key, choice_ids)
+        answer.is_correct = is_correct
+        answer.save(update_fields=['selected_mask', 'is_correct'])
+        return is_correct
+
+    def finish(self, session):
+        """
+        Scores the session from its recorded answers and closes it.
+        Returns (total, correct).
+        """
+        live = live_state_enabled()
+        if live:
+            flush_state(self.kind, session.pk)
+        counts = session.answers.aggregate(total=Count('id'), correct=Count('id', filter=Q(is_correct=True)))
+        self.close(session, counts['total'], counts['correct'])
+        if live:
+            discard_state(self.kind, session.pk)
+        # Counted over every answer, so the result serializer can reuse them
+        session.correct_count = counts['correct']
+        session.wrong_count = counts['total'] - counts['correct']
+        return counts['total'], counts['correct']
+
+    def submit(self, session, items):
+        """
+        Grades a full submission (see grading.grade_submission) and closes
+        the session. Call it inside the transaction that also updates
+        anything derived from the result. Returns (total, correct).
+        """
+        if live_state_enabled():
+            flush_state(self.kind, session.pk)
+            transaction.on_commit(partial(discard_state, self.kind, session.pk))
+
+        answers, graded = grade_submission(self.answer_model, session, items)
+        total = len(answers) if self.score_unanswered else len(graded)
+        correct = sum(1 for answer in graded if answer.is_correct)
+        self.close(session, total, correct)
+        return total, correct
+
+    def history(self, user):
+        """
+        The user's finished sessions, newest first, with correct_count and
+        wrong_count annotated in the same query.
+        """
+        return (
+            self.session_model.objects
+            .filter(user=user, finished_at__isnull=False)
+            .annotate(
+                correct_count=Count('answers', filter=Q(answers__is_correct=True)),
+                wrong_count=Count('answers', filter=Q(answers__is_correct=False)),
+            )
+            .order_by('-finished_at', '-id')
+        )
+
+    def close(self, session, total, correct):
+        session.score = round((correct / total) * 100) if total else 0
+        session.finished_at = timezone.now()
+        session.save()
+
+
+class MockTestEngine(SessionEngine):
+    kind = "mock"
+    question_type = "practice"
+
+    def pick_questions(self, request, total_questions):
+        # A ready-made paper from the pool (selection engines that pick per
+        # user skip it), else sample one proportionally by chapter
+        selection = get_selection_engine()
+        paper = None if selection.per_user else take_paper(request)
+        if paper is None:
+            chapter_counts, questions = sample_paper(
+                total_questions, self.question_type, select=partial(selection.select, user=request.user)
+            )
+            paper = self.make_paper(request, chapter_counts, questions)
+        return paper
+
+    def start(self, request, total_questions):
+        session, paper = super().start(request, total_questions)
+        get_selection_engine().record(request.user, paper.question_ids)
+        return session, paper
+
+
+class FreeMockTestEngine(SessionEngine):
+    kind = "free"
+    question_type = "freeMockTest"
+    score_unanswered = False
+
+
+mock_tests = MockTestEngine()
+free_mock_tests = FreeMockTestEngine()
@@ -0,0 +1,151 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, post_delete, pre_delete
+from django.dispatch import receiver
+
+from main.models import HomePage, Chapter, Lesson, LessonContent, Glossary, Question, QuestionOption, QuestionGlossary
+from subscriptions.models import SubscriptionPlan
+from .snapshots import refresh_lesson_snapshots
+from .bundles import mark_chapters_stale
+from . import hotcache
+from .grading import shift_selected_masks
+from .live_sessions import SESSION_MODELS, live_state_enabled, shift_cached_masks
+
+
+# ------------------------------- Lesson page snapshots -------------------------------
+
+def _refresh_on_commit(lesson_ids):
+    lesson_ids = [lesson_id for lesson_id in lesson_ids if lesson_id is not None]
+    if lesson_ids:
+        transaction.on_commit(lambda: refresh_lesson_snapshots(lesson_ids))
+
+
+@receiver([post_save, post_delete], sender=LessonContent)
+def lesson_content_changed(sender, instance, **kwargs):
+    _refresh_on_commit([instance.lesson_id])
+
+
+@receiver([post_save, post_delete], sender=Glossary)
+def glossary_changed(sender, instance, **kwargs):
+    lesson_id = (
+        LessonContent.objects
+        .filter(pk=instance.lesson_content_id)
+        .values_list('lesson_id', flat=True)
+        .first()
+    )
+    # When the content itself is being deleted, its own signal covers the lesson
+    _refresh_on_commit([lesson_id])
+
+
+@receiver(post_save, sender=Lesson)
+def lesson_saved(sender, instance, created, **kwargs):
+    if not created:
+        _refresh_on_commit([instance.id])
+
+
+@receiver(post_save, sender=Chapter)
+def chapter_saved(sender, instance, created, **kwargs):
+    # chapter_name is part of every rendered page of the chapter
+    if not created:
+        _refresh_on_commit(Lesson.objects.filter(chapter=instance).values_list('id', flat=True))
+
+
+# ------------------------------- Offline chapter bundles -------------------------------
+
+@receiver(post_save, sender=Chapter)
+def bundle_chapter_saved(sender, instance, **kwargs):
+    mark_chapters_stale([instance.id])
+
+
+@receiver(pre_save, sender=Lesson)
+@receiver(pre_save, sender=Question)
+def bundle_chapter_child_saving(sender, instance, raw=False, **kwargs):
+    # The chapter before the save, so a move also marks the old one stale
+    instance._previous_chapter_id = None
+    if not raw and instance.pk is not None:
+        instance._previous_chapter_id = sender.objects.filter(pk=instance.pk).values_list('chapter_id', flat=True).first()
+
+
+@receiver([post_save, post_delete], sender=Lesson)
+@receiver([post_save, post_delete], sender=Question)
+def bundle_chapter_child_changed(sender, instance, **kwargs):
+    mark_chapters_stale([getattr(instance, '_previous_chapter_id', None), instance.chapter_id])
+
+
+@receiver(pre_save, sender=LessonContent)
+def bundle_lesson_content_saving(sender, instance, raw=False, **kwargs):
+    instance._previous_chapter_id = None
+    if not raw and instance.pk is not None:
+        instance._previous_chapter_id = (
+            LessonContent.objects.filter(pk=instance.pk).values_list('lesson__chapter_id', flat=True).first()
+        )
+
+
+@receiver([post_save, post_delete], sender=LessonContent)
+def bundle_lesson_content_changed(sender, instance, **kwargs):
+    chapter_ids = list(Lesson.objects.filter(pk=instance.lesson_id).values_list('chapter_id', flat=True))
+    mark_chapters_stale(chapter_ids + [getattr(instance, '_previous_chapter_id', None)])
+
+
+@receiver([post_save, post_delete], sender=Glossary)
+def bundle_glossary_changed(sender, instance, **kwargs):
+    mark_chapters_stale(
+        LessonContent.objects.filter(pk=instance.lesson_content_id).values_list('lesson__chapter_id', flat=True)
+    )
+
+
+@receiver([post_save, post_delete], sender=QuestionOption)
+@receiver([post_save, post_delete], sender=QuestionGlossary)
+def bundle_question_child_changed(sender, instance, **kwargs):
+    mark_chapters_stale(Question.objects.filter(pk=instance.question_id).values_list('chapter_id', flat=True))
+
+
+# ------------------------------- Stored answer selections -------------------------------
+
+def _option_deletion(origin):
+    # Bookkeeping of one delete() call, kept on what is being deleted (the
+    # option, its question or a queryset)
+    if not hasattr(origin, '_option_deletion'):
+        origin._option_deletion = {'pending': set(), 'positions': {}}
+    return origin._option_deletion
+
+
+@receiver(pre_delete, sender=QuestionOption)
+def option_deleting(sender, instance, origin=None, **kwargs):
+    # selected_mask bits are option positions in id order. A delete() of
+    # several options sends every pre_delete before any row goes, so all
+    # positions are taken against the same options and applied together
+    # once the last of them is deleted
+    deletion = _option_deletion(origin or instance)
+    position = QuestionOption.objects.filter(question_id=instance.question_id, id__lt=instance.id).count()
+    deletion['pending'].add(instance.id)
+    deletion['positions'].setdefault(instance.question_id, []).append(position)
+
+
+@receiver(post_delete, sender=QuestionOption)
+def option_deleted(sender, instance, origin=None, **kwargs):
+    origin = origin or instance
+    deletion = _option_deletion(origin)
+    deletion['pending'].discard(instance.id)
+    if deletion['pending']:
+        return
+    del origin._option_deletion
+
+    for question_id, positions in deletion['positions'].items():
+        for kind, (_, answer_model) in SESSION_MODELS.items():
+            shift_selected_masks(answer_model, question_id, positions)
+            if live_state_enabled():
+                transaction.on_commit(partial(shift_cached_masks, kind, question_id, positions))
+
+
+# ------------------------------- Hot response cache -------------------------------
+
+@receiver([post_save, post_delete], sender=HomePage)
+def home_page_changed(sender, instance, **kwargs):
+    transaction.on_commit(lambda: hotcache.evict('home'))
+
+
+@receiver([post_save, post_delete], sender=SubscriptionPlan)
+def subscription_plan_changed(sender, instance, **kwargs):
+    transaction.on_commit(lambda: hotcache.evict('subscription-plans'))
@@ -0,0 +1,151 @@
+"""
+Pre-rendered lesson page snapshots for ChapterLessonDetailView.
+
+Each (lesson, step) page is stored in the cache as the JSON bytes of its
+serialized LessonContent rows, so a page read is a single cache fetch. Keys
+include the content version (main.content_cache), which every content
+change bumps, so old pages are never read again; the pages of a changed
+lesson are rebuilt in the background under the new version (see
+api.signals).
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Prefetch
+from rest_framework.renderers import JSONRenderer
+
+from main.content_cache import get_content_version
+from main.models import Lesson, LessonContent, Glossary
+from .serializers import LessonContentModelSerializer
+
+logger = logging.getLogger(__name__)
+
+PAGE_SIZE = 10
+
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="lesson-snapshots")
+
+
+def _timeout():
+    return getattr(settings, "CONTENT_CACHE_TIMEOUT", 60 * 60)
+
+
+def _page_key(version, lesson_id, step):
+    return f"lesson-snapshot:v{version}:{lesson_id}:{step}"
+
+
+def _meta_key(version, lesson_id):
+    return f"lesson-snapshot:v{version}:{lesson_id}:meta"
+
+
+def build_lesson_snapshots(lesson_id, version=None):
+    """
+    Renders every page of the lesson and stores them under the content
+    version, read before the content (unless given), so pages rendered
+    from content an edit has since replaced land under a version nobody
+    reads any more. Returns the lesson meta dict ({chapter_id, total,
+    pages}) or None if the lesson is gone.
+    """
+    if version is None:
+        version = get_content_version()
+    lesson = Lesson.objects.filter(id=lesson_id).select_related("chapter").first()
+    if lesson is None:
+        return None
+
+    contents = list(
+        LessonContent.objects
+        .filter(lesson=lesson)
+        .order_by("id")
+        .prefetch_related(Prefetch("glossaries", queryset=Glossary.objects.order_by("id")))
+    )
+    for content in contents:
+        # chapter_name reads lesson.chapter; reuse the one instance
+        content.lesson = lesson
+
+    renderer = JSONRenderer()
+    pages = {}
+    for step, start in enumerate(range(0, len(contents), PAGE_SIZE)):
+        items = contents[start:start + PAGE_SIZE]
+        pages[_page_key(version, lesson_id, step)] = {
+            "chapter_id": lesson.chapter_id,
+            "total": len(contents),
+            "ids": [item.id for item in items],
+            "content": renderer.render(LessonContentModelSerializer(items, many=True).data),
+        }
+
+    old_meta = cache.get(_meta_key(version, lesson_id))
+    meta = {"chapter_id": lesson.chapter_id, "total": len(contents), "pages": len(pages)}
+
+    cache.set_many(pages, timeout=_timeout())
+    cache.set(_meta_key(version, lesson_id), meta, timeout=_timeout())
+    if old_meta and old_meta["pages"] > meta["pages"]:
+        cache.delete_many([_page_key(version, lesson_id, step) for step in range(meta["pages"], old_meta["pages"])])
+    return meta
+
+
+def get_lesson_page(lesson_id, step):
+    """
+    Returns the snapshot of one page, or None if the lesson does not exist
+    or has no content for that step.
+    """
+    if step < 0:
+        return None
+
+    version = get_content_version()
+    page = cache.get(_page_key(version, lesson_id, step))
+    if page is not None:
+        return page
+
+    meta = cache.get(_meta_key(version, lesson_id))
+    if meta is not None and step >= meta["pages"]:
+        return None
+
+    meta = build_lesson_snapshots(lesson_id, version)
+    if meta is None or step >= meta["pages"]:
+        return None
+    return cache.get(_page_key(version, lesson_id, step))
+
+
+def _rebuild(lesson_ids):
+    try:
+        for lesson_id in lesson_ids:
+            build_lesson_snapshots(lesson_id)
+    except Exception:
+        logger.exception("Rebuilding lesson snapshots failed for %s", lesson_ids)
+    finally:
+        connection.close()
+
+
+def refresh_lesson_snapshots(lesson_ids):
+    """
+    Rebuilds the snapshots of the lessons under the current content version
+    in the background (inline when LESSON_SNAPSHOT_ASYNC is False). Call it
+    after the version bump of the change, i.e. on commit.
+    """
+    lesson_ids = list(lesson_ids)
+    if getattr(settings, "LESSON_SNAPSHOT_ASYNC", True):
+        _executor.submit(_rebuild, lesson_ids)
+    else:
+        for lesson_id in lesson_ids:
+            build_lesson_snapshots(lesson_id)
+
+
+def render_lesson_page(step, page, completion_percentage):
+    """
+    Splices the per-request fields around the pre-rendered content bytes.
+    Matches what JSONRenderer produces for the equivalent Response.
+    """
+    renderer = JSONRenderer()
+    return b"".join([
+        b'{"success":true,"message":"Lesson content retrieved successfully.","data":{"step":',
+        renderer.render(step),
+        b',"total_items":',
+        renderer.render(page["total"]),
+        b',"completion_percentage":',
+        renderer.render(completion_percentage) if completion_percentage is not None else b"null",
+        b',"content":',
+        page["content"],
+        b"}}",
+    ])
@@ -1,3 +1,1001 @@
-from django.test import TestCase
+import gzip
+import json
+import tempfile
+from datetime import timedelta
 
-# Create your tests here.
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.core.cache import cache
+from django.contrib.auth import get_user_model
+from django.db.models import F
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from main.models import Chapter, Lesson, LessonContent, Glossary, LessonProgress, HomePage, GuidesSupport, GuideSupportContent, Question, QuestionOption, ChapterProgress, QuestionGlossary, ContentVersion, ContentChange, ChapterBundle, MockTestSession, MockTestAnswer, FreeMockTestSession, FreeMockTestAnswer
+from main.changelog import compact_changes
+from main.content_cache import CONTENT_VERSION_KEY
+from subscriptions.models import SubscriptionPlan
+from .serializers import LessonContentModelSerializer, QuestionForTestSerializer, QuestionSerializer, question_for_test_data
+from .hotcache import reset_hot_cache
+from .snapshots import get_lesson_page
+from .question_pool import get_question_pool
+from .paper_pool import refill_papers, clear_papers, paper_pool_stats, take_paper
+from .selection import RecencySelection
+from .grading import get_answer_keys
+from .practice_stream import practice_questions, CHUNK_SIZE
+
+User = get_user_model()
+
+
+class ChapterListViewTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username="student", email="student@example.com", password="pass")
+
+    def make_catalog(self, chapters, lessons_per_chapter):
+        with self.captureOnCommitCallbacks(execute=True):
+            for c in range(chapters):
+                chapter = Chapter.objects.create(name=f"Chapter {c}")
+                for l in range(lessons_per_chapter):
+                    lesson = Lesson.objects.create(name=f"{l + 1}", title=f"Lesson {l + 1}", chapter=chapter)
+                    if l % 2 == 0:
+                        LessonProgress.objects.create(user=self.user, lesson=lesson, completion_percentage=100.0)
+
+    def test_anonymous_query_count_is_constant(self):
+        self.make_catalog(2, 2)
+        with self.assertNumQueries(2):
+            self.client.get("/chapters/")
+
+        self.make_catalog(10, 5)
+        with self.assertNumQueries(2):
+            response = self.client.get("/chapters/")
+        self.assertEqual(len(response.data["data"]), 12)
+        self.assertNotIn("completion_percentage", response.data["data"][0])
+
+        # Served from the content cache until the content changes again
+        with self.assertNumQueries(0):
+            cached = self.client.get("/chapters/")
+        self.assertEqual(cached.data["data"], response.data["data"])
+
+    def test_authenticated_query_count_is_constant(self):
+        # progress fingerprint for the ETag + chapters + lessons + completed lessons
+        self.client.force_authenticate(self.user)
+        self.make_catalog(2, 2)
+        with self.assertNumQueries(4):
+            self.client.get("/chapters/")
+
+        self.make_catalog(10, 5)
+        with self.assertNumQueries(4):
+            response = self.client.get("/chapters/")
+        self.assertEqual(len(response.data["data"]), 12)
+
+    def test_payload(self):
+        self.client.force_authenticate(self.user)
+        self.make_catalog(1, 3)
+        Chapter.objects.create(name="Empty")
+
+        data = self.client.get("/chapters/").data["data"]
+
+        self.assertEqual(data[0]["lessons"], ["1", "2", "3"])
+        self.assertEqual(data[0]["completion_percentage"], 66.67)
+        self.assertEqual(data[1]["lessons"], [])
+        self.assertEqual(data[1]["completion_percentage"], 0.0)
+
+
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        reset_hot_cache()
+        self.client = APIClient()
+        with self.captureOnCommitCallbacks(execute=True):
+            HomePage.objects.create(title="Welcome", description="Life in the UK")
+
+    def test_not_modified_until_content_changes(self):
+        response = self.client.get("/home/")
+        etag = response["ETag"]
+        self.assertTrue(response.has_header("Last-Modified"))
+
+        with self.assertNumQueries(0):
+            response = self.client.get("/home/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            HomePage.objects.create(title="New", description="Updated")
+        response = self.client.get("/home/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content)["data"]["title"], "New")
+
+    def test_progress_views_use_per_user_etag(self):
+        user = User.objects.create_user(username="student", email="student@example.com", password="pass")
+        chapter = Chapter.objects.create(name="Chapter")
+        lesson = Lesson.objects.create(name="1", title="Lesson", chapter=chapter)
+        self.client.force_authenticate(user)
+
+        response = self.client.get("/chapters/")
+        etag = response["ETag"]
+        self.assertFalse(response.has_header("Last-Modified"))
+        self.assertIn("Authorization", response["Vary"])
+        self.assertEqual(self.client.get("/chapters/", HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        LessonProgress.objects.create(user=user, lesson=lesson, completion_percentage=100.0)
+        self.assertEqual(self.client.get("/chapters/", HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_edit_by_another_worker_changes_the_etag(self):
+        etag = self.client.get("/home/")["ETag"]
+
+        # Saved elsewhere: no signal ran here, only the shared version moved
+        HomePage.objects.update(title="Edited")
+        ContentVersion.objects.update(version=F("version") + 1)
+        self.assertEqual(self.client.get("/home/", HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        cache.delete(CONTENT_VERSION_KEY)  # this worker's copy of the version expires
+
+        response = self.client.get("/home/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+        self.assertEqual(json.loads(response.content)["data"]["title"], "Edited")
+
+
+@override_settings(LESSON_SNAPSHOT_ASYNC=False)
+class LessonSnapshotTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.chapter = Chapter.objects.create(name="History")
+        self.lesson = Lesson.objects.create(name="1", title="Tudors", chapter=self.chapter)
+        for i in range(12):
+            content = LessonContent.objects.create(lesson=self.lesson, description=f"Part {i} – “quoted”")
+            Glossary.objects.create(lesson_content=content, title=f"Term {i}", description="Meaning")
+        self.url = f"/chapters/{self.chapter.id}/{self.lesson.id}/"
+
+    def expected_content(self, step):
+        contents = LessonContent.objects.filter(lesson=self.lesson).order_by("id")[step * 10:step * 10 + 10]
+        return json.loads(json.dumps(LessonContentModelSerializer(contents, many=True).data))
+
+    def test_page_matches_serializer_output(self):
+        response = self.client.get(self.url, {"step": 1})
+        body = json.loads(response.content)
+
+        self.assertEqual(response["Content-Type"], "application/json")
+        self.assertEqual(body["data"]["step"], 1)
+        self.assertEqual(body["data"]["total_items"], 12)
+        self.assertIsNone(body["data"]["completion_percentage"])
+        self.assertEqual(body["data"]["content"], self.expected_content(1))
+
+        with self.assertNumQueries(0):
+            again = self.client.get(self.url, {"step": 1})
+        self.assertEqual(again.content, response.content)
+
+        self.assertEqual(self.client.get(self.url, {"step": 2}).status_code, 404)
+        self.assertEqual(self.client.get(f"/chapters/{self.chapter.id + 1}/{self.lesson.id}/").status_code, 404)
+
+    def test_completion_percentage_is_spliced_in(self):
+        user = User.objects.create_user(username="student", email="student@example.com", password="pass")
+        self.client.force_authenticate(user)
+
+        body = json.loads(self.client.get(self.url, {"step": 0}).content)
+
+        self.assertAlmostEqual(body["data"]["completion_percentage"], 10 / 12 * 100)
+        self.assertEqual(body["data"]["content"], self.expected_content(0))
+
+    def test_progress_is_recorded_in_fixed_queries(self):
+        self.client.force_authenticate(User.objects.create_user(username="student", email="student@example.com", password="pass"))
+        self.client.get(self.url, {"step": 0})
+
+        # progress row, completed ids, bulk insert, recount, reload
+        with self.assertNumQueries(5):
+            body = json.loads(self.client.get(self.url, {"step": 1}).content)
+        self.assertAlmostEqual(body["data"]["completion_percentage"], 100.0)
+
+        # nothing new on a revisit: no writes
+        with self.assertNumQueries(2):
+            self.client.get(self.url, {"step": 1})
+        self.assertEqual(LessonProgress.objects.get().completed_contents.count(), 12)
+
+    def test_counters_are_recounted_from_the_through_table(self):
+        self.client.force_authenticate(User.objects.create_user(username="student", email="student@example.com", password="pass"))
+        self.client.get(self.url, {"step": 0})
+        # Left behind by two page loads that each counted only their own share
+        LessonProgress.objects.update(completed_count=2, completion_percentage=2 / 12 * 100)
+
+        body = json.loads(self.client.get(self.url, {"step": 0}).content)
+        self.assertAlmostEqual(body["data"]["completion_percentage"], 10 / 12 * 100)
+
+        body = json.loads(self.client.get(self.url, {"step": 1}).content)
+        self.assertAlmostEqual(body["data"]["completion_percentage"], 100.0)
+        progress = LessonProgress.objects.get()
+        self.assertEqual((progress.completed_count, progress.total_count), (12, 12))
+
+    def test_moved_contents_no_longer_count(self):
+        self.client.force_authenticate(User.objects.create_user(username="student", email="student@example.com", password="pass"))
+        self.client.get(self.url, {"step": 0})
+        other = Lesson.objects.create(name="2", title="Stuarts", chapter=self.chapter)
+        with self.captureOnCommitCallbacks(execute=True):
+            for content in LessonContent.objects.filter(lesson=self.lesson).order_by("id")[:2]:
+                content.lesson = other
+                content.save()
+            LessonContent.objects.bulk_create([LessonContent(lesson=self.lesson, description="Added") for _ in range(2)])
+
+        # Two new contents on the page, then a revisit with nothing new
+        for _ in range(2):
+            body = json.loads(self.client.get(self.url, {"step": 0}).content)
+            self.assertAlmostEqual(body["data"]["completion_percentage"], 10 / 12 * 100)
+        progress = LessonProgress.objects.get(lesson=self.lesson)
+        self.assertEqual((progress.completed_count, progress.total_count), (10, 12))
+
+    def test_snapshots_follow_content_changes(self):
+        self.client.get(self.url, {"step": 1})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            LessonContent.objects.create(lesson=self.lesson, description="Added")
+
+        body = json.loads(self.client.get(self.url, {"step": 1}).content)
+        self.assertEqual(body["data"]["total_items"], 13)
+        self.assertEqual(body["data"]["content"], self.expected_content(1))
+
+    def test_pages_follow_edits_made_by_another_worker(self):
+        self.client.get(self.url, {"step": 1})
+        stale_version = ContentVersion.objects.get().version
+        stale_page = get_lesson_page(self.lesson.id, 1)
+
+        LessonContent.objects.filter(lesson=self.lesson).update(description="Edited")
+        ContentVersion.objects.update(version=F("version") + 1)
+        cache.delete(CONTENT_VERSION_KEY)
+        # A build that read the content before the edit finishes late
+        cache.set(f"lesson-snapshot:v{stale_version}:{self.lesson.id}:1", stale_page)
+
+        body = json.loads(self.client.get(self.url, {"step": 1}).content)
+        self.assertEqual({item["description"] for item in body["data"]["content"]}, {"Edited"})
+
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        chapter = Chapter.objects.create(name="History")
+        lesson = Lesson.objects.create(name="1", title="Tudors", chapter=chapter)
+        LessonContent.objects.bulk_create([LessonContent(lesson=lesson, description=f"Part {i}") for i in range(25)])
+        self.lesson_url = f"/chapters/{chapter.id}/{lesson.id}/"
+
+        guide = GuidesSupport.objects.create(name="Exam", title="Exam day")
+        GuideSupportContent.objects.bulk_create([GuideSupportContent(guide=guide, description=f"Tip {i}") for i in range(15)])
+        self.guide_url = f"/guide/{guide.id}/"
+
+    def walk(self, url):
+        pages = []
+        while url:
+            data = self.client.get(url).data["data"]
+            pages.append(data)
+            url = data["next"]
+        return pages
+
+    def test_lesson_cursor_pages(self):
+        pages = self.walk(self.lesson_url + "?cursor=")
+
+        self.assertEqual([len(p["content"]) for p in pages], [10, 10, 5])
+        self.assertEqual(pages[-1]["total_items"], 25)
+        self.assertIsNone(pages[0]["prev"])
+
+        previous = self.client.get(pages[-1]["prev"]).data["data"]
+        self.assertEqual(
+            [c["id"] for c in previous["content"]],
+            [c["id"] for c in pages[1]["content"]],
+        )
+
+    def test_guide_cursor_and_step_modes_agree(self):
+        pages = self.walk(self.guide_url + "?cursor=")
+        by_step = [self.client.get(self.guide_url, {"step": step}).data["data"] for step in range(2)]
+
+        self.assertEqual(
+            [[c["id"] for c in p["content"]] for p in pages],
+            [[c["id"] for c in p["content"]] for p in by_step],
+        )
+        self.assertEqual(by_step[0]["total_items"], 15)
+        self.assertEqual(self.client.get(self.guide_url, {"step": 2}).status_code, 404)
+
+
+class ChapterBundleTests(TestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        media_root = override_settings(MEDIA_ROOT=media.name)
+        media_root.enable()
+        self.addCleanup(media_root.disable)
+
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user(username="student", email="student@example.com", password="pass"))
+        self.chapter = Chapter.objects.create(name="History")
+        lesson = Lesson.objects.create(name="1", title="Tudors", chapter=self.chapter)
+        content = LessonContent.objects.create(lesson=lesson, description="Henry VIII")
+        Glossary.objects.create(lesson_content=content, title="Reformation", description="...")
+        question = Question.objects.create(chapter=self.chapter, question_text="Who?", type="practice")
+        QuestionOption.objects.create(question=question, text="Henry", is_correct=True)
+        self.url = f"/chapters/{self.chapter.id}/bundle/"
+
+    def test_bundle_is_content_addressed_and_rebuilt_on_change(self):
+        response = self.client.get(self.url)
+        payload = json.loads(gzip.decompress(response.content))
+        etag = response["ETag"]
+
+        self.assertEqual(payload["lessons"][0]["contents"][0]["glossaries"][0]["title"], "Reformation")
+        self.assertEqual(payload["questions"][0]["correct_option_ids"], [QuestionOption.objects.get().id])
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        Question.objects.create(chapter=self.chapter, question_text="When?", type="practice")
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+        self.assertEqual(len(json.loads(gzip.decompress(response.content))["questions"]), 2)
+
+    def test_moving_a_lesson_rebuilds_both_chapters(self):
+        law = Chapter.objects.create(name="Law")
+        law_url = f"/chapters/{law.id}/bundle/"
+        self.client.get(self.url)
+        self.client.get(law_url)
+
+        lesson = Lesson.objects.get()
+        lesson.chapter = law
+        lesson.save()
+
+        self.assertEqual(ChapterBundle.objects.filter(is_stale=True).count(), 2)
+        self.assertEqual(json.loads(gzip.decompress(self.client.get(self.url).content))["lessons"], [])
+        self.assertEqual(len(json.loads(gzip.decompress(self.client.get(law_url).content))["lessons"]), 1)
+
+
+class HotCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        reset_hot_cache()
+        self.client = APIClient()
+        HomePage.objects.create(title="Welcome", description="Life in the UK")
+        SubscriptionPlan.objects.create(name="1_week", price="4.99", duration_days=7)
+
+    def test_rendered_bytes_are_reused_until_evicted(self):
+        first = self.client.get("/subscription-plans/")
+        with self.assertNumQueries(0):
+            second = self.client.get("/subscription-plans/")
+        self.assertEqual(first.content, second.content)
+        self.assertEqual(json.loads(second.content)["data"][0]["name_display"], "1 Week Access")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            SubscriptionPlan.objects.create(name="lifetime", price="19.99")
+        self.assertEqual(len(json.loads(self.client.get("/subscription-plans/").content)["data"]), 2)
+
+    def test_home_page_hit_ratio_in_metrics(self):
+        self.client.get("/home/")
+        self.client.get("/home/")
+        with self.captureOnCommitCallbacks(execute=True):
+            HomePage.objects.create(title="New", description="Updated")
+        self.assertEqual(json.loads(self.client.get("/home/").content)["data"]["title"], "New")
+
+        self.client.force_authenticate(User.objects.create_superuser(username="admin", email="admin@example.com", password="pass"))
+        stats = self.client.get("/metrics/cache/").data["data"]["hot_cache"]
+        self.assertEqual((stats["hits"], stats["misses"], stats["evictions"]), (1, 2, 1))
+
+
+@override_settings(LESSON_SNAPSHOT_ASYNC=False)
+class DeltaSyncTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user(username="student", email="student@example.com", password="pass"))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.chapter = Chapter.objects.create(name="History")
+            self.lesson = Lesson.objects.create(name="1", title="Tudors", chapter=self.chapter)
+
+    def sync(self, since=None):
+        response = self.client.get("/sync/", {} if since is None else {"since": since})
+        self.assertEqual(response.status_code, 200)
+        return json.loads(b"".join(response.streaming_content))["data"]
+
+    def test_full_sync_then_delta(self):
+        data = self.sync()
+        self.assertTrue(data["reset"])
+        chapter = data["models"]["chapter"]
+        self.assertEqual(dict(zip(chapter["fields"], chapter["rows"][0]))["name"], "History")
+        self.assertIn("glossary", data["models"])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.lesson.title = "The Tudors"
+            self.lesson.save()
+            Chapter.objects.create(name="Law").delete()
+
+        delta = self.sync(data["version"])
+        self.assertFalse(delta["reset"])
+        self.assertEqual(set(delta["models"]), {"lesson", "chapter"})
+        lesson = delta["models"]["lesson"]
+        self.assertEqual(dict(zip(lesson["fields"], lesson["rows"][0]))["title"], "The Tudors")
+        self.assertEqual(delta["models"]["chapter"]["rows"], [])
+        self.assertEqual(len(delta["models"]["chapter"]["deleted"]), 1)
+
+        self.assertEqual(self.sync(delta["version"])["models"], {})
+
+    def test_compaction_forces_reset_for_old_versions(self):
+        version = self.sync()["version"]
+        with self.captureOnCommitCallbacks(execute=True):
+            Lesson.objects.create(name="2", title="Stuarts", chapter=self.chapter)
+
+        checkpoint, removed = compact_changes(timezone.now() + timedelta(seconds=1))
+        self.assertEqual(removed, 3)
+        self.assertTrue(self.sync(version)["reset"])
+        self.assertFalse(self.sync(checkpoint.version)["reset"])
+
+    def test_invalid_since(self):
+        self.assertEqual(self.client.get("/sync/", {"since": "x"}).status_code, 400)
+
+    def test_versions_are_taken_in_commit_order(self):
+        version = self.sync()["version"]
+        with self.captureOnCommitCallbacks() as callbacks:
+            Chapter.objects.create(name="Law")
+            self.lesson.title = "The Tudors"
+            self.lesson.save()
+        log_callbacks = [callback for callback in callbacks if callback.__module__ == "main.changelog"]
+
+        # The lesson edit commits first, so it gets the next version even
+        # though its log entry is created after the chapter's
+        log_callbacks[1]()
+        self.assertEqual(self.sync(version)["models"].keys(), {"lesson"})
+        log_callbacks[0]()
+        delta = self.sync(version + 1)
+        self.assertEqual((delta["version"], delta["models"].keys()), (version + 2, {"chapter"}))
+        self.assertEqual(
+            list(ContentChange.objects.filter(version__gt=version).order_by("version").values_list("model", flat=True)),
+            ["lesson", "chapter"],
+        )
+
+
+@override_settings(MOCK_PAPER_POOL_SIZE=0)
+class MockTestStartTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user(username="student", email="student@example.com", password="pass"))
+        with self.captureOnCommitCallbacks(execute=True):
+            for c, size in enumerate([10, 10, 5]):
+                chapter = Chapter.objects.create(name=f"Chapter {c}")
+                for i in range(size):
+                    question = Question.objects.create(chapter=chapter, question_text=f"{c}.{i}", type="practice")
+                    QuestionOption.objects.create(question=question, text="Yes", is_correct=True)
+                Question.objects.create(chapter=chapter, question_text="Mock only", type="freeMockTest")
+
+    def test_samples_from_index_and_loads_only_the_paper(self):
+        self.client.post("/mock-test/start/")
+
+        # sampled questions, options, glossaries, session, answers,
+        # evaluation update
+        with self.assertNumQueries(6):
+            response = self.client.post("/mock-test/start/")
+
+        questions = response.data["data"]["questions"]
+        self.assertEqual(len({q["id"] for q in questions}), 24)
+        self.assertFalse(Question.objects.filter(id__in=[q["id"] for q in questions]).exclude(type="practice").exists())
+        self.assertEqual(MockTestAnswer.objects.filter(session_id=response.data["data"]["session_id"]).count(), 24)
+
+    def test_submit_all_answers_in_fixed_queries(self):
+        data = self.client.post("/mock-test/start/").data["data"]
+        answers = [
+            {"question_id": q["id"], "selected_options": q["correct_option_ids"] if i % 3 else [q["options"][0]["id"] + 1000]}
+            for i, q in enumerate(data["questions"])
+        ]
+        answers[1]["selected_options"] = []
+
+        # session, savepoint, answers, answer keys (cold), bulk update,
+        # session, evaluation update, release, result counts
+        with self.assertNumQueries(10):
+            response = self.client.post(f"/mock-test/{data['session_id']}/submit-all/", {"answers": answers}, format="json")
+
+        self.assertEqual(response.data["data"]["correct"], 15)
+        self.assertEqual(response.data["data"]["score"], round(15 / 24 * 100))
+        self.assertFalse(MockTestAnswer.selected_choices.through.objects.exists())
+
+        retrieved = self.client.get(f"/mock-test/{data['session_id']}/").data["data"]["answers"]
+        selected = {a["question"]["id"]: a["selected_choices"] for a in retrieved}
+        self.assertEqual(selected[answers[2]["question_id"]], answers[2]["selected_options"])
+        self.assertEqual(selected[answers[1]["question_id"]], [])
+
+    def test_retrieve_in_fixed_queries(self):
+        session_id = self.client.post("/mock-test/start/").data["data"]["session_id"]
+
+        # session, answers with questions, options, glossaries, answer keys (cold)
+        with self.assertNumQueries(5):
+            response = self.client.get(f"/mock-test/{session_id}/")
+        self.assertEqual(len(response.data["data"]["answers"]), 24)
+
+    def test_fast_path_matches_serializer(self):
+        question = Question.objects.first()
+        question.image = "questions/map.png"
+        question.save()
+        question.glossary.create(title="Magna Carta")
+        question = Question.objects.prefetch_related("options", "glossary").get(pk=question.pk)
+        request = self.client.get("/").wsgi_request
+
+        for context in ({}, {"request": request}):
+            self.assertEqual(
+                question_for_test_data(question, context.get("request")),
+                QuestionForTestSerializer(question, context=context).data,
+            )
+
+    @override_settings(ANSWER_SELECTION_STORAGE="m2m")
+    def test_m2m_storage_mode(self):
+        data = self.client.post("/mock-test/start/").data["data"]
+        question = data["questions"][0]
+        self.client.post(f"/mock-test/{data['session_id']}/answer/", {
+            "question": question["id"], "selected_choice_ids": question["correct_option_ids"],
+        }, format="json")
+
+        answer = MockTestAnswer.objects.get(session_id=data["session_id"], question_id=question["id"])
+        self.assertEqual(list(answer.selected_choices.values_list("id", flat=True)), question["correct_option_ids"])
+        retrieved = self.client.get(f"/mock-test/{data['session_id']}/").data["data"]["answers"]
+        self.assertEqual(retrieved[0]["selected_choices"], question["correct_option_ids"])
+
+    def test_free_submit_all_answers(self):
+        session = FreeMockTestSession.objects.create(user=User.objects.get(), total_questions=3)
+        questions = list(Question.objects.filter(type="freeMockTest"))
+        for question in questions:
+            QuestionOption.objects.create(question=question, text="Yes", is_correct=True)
+            FreeMockTestAnswer.objects.create(session=session, question=question)
+
+        answers = [{"question_id": str(q.id), "selected_options": [q.options.get().id]} for q in questions[:2]]
+        answers.append({"question_id": 0, "selected_options": []})
+        response = self.client.post(f"/free-mock-tests/{session.id}/submit-all-answers/", {"answers": answers}, format="json")
+
+        self.assertEqual((response.data["data"]["correct"], response.data["data"]["score"]), (2, 100))
+        self.assertEqual(FreeMockTestAnswer.objects.exclude(selected_mask=0).count(), 2)
+
+    def test_index_follows_question_changes(self):
+        chapter = Chapter.objects.first()
+        pool = get_question_pool()
+        self.assertEqual(sum(len(ids) for ids in pool.values()), 25)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            question = Question.objects.create(chapter=chapter, question_text="New", type="practice")
+        self.assertIn(question.id, get_question_pool()[chapter.id])
+
+    def test_index_follows_changes_made_by_another_worker(self):
+        chapter = Chapter.objects.first()
+        moved = Question.objects.filter(type="freeMockTest").first()
+        get_question_pool()
+
+        Question.objects.filter(pk=moved.pk).update(type="practice")
+        ContentVersion.objects.update(version=F("version") + 1)
+        cache.delete(CONTENT_VERSION_KEY)
+
+        self.assertIn(moved.id, get_question_pool()[chapter.id])
+
+
+class AnswerKeyTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            chapter = Chapter.objects.create(name="History")
+            self.question = Question.objects.create(chapter=chapter, question_text="Which?", type="practice")
+            self.options = [QuestionOption.objects.create(question=self.question, text=t, is_correct=t != "C") for t in "ABC"]
+
+    def test_grades_in_memory(self):
+        a, b, c = (o.id for o in self.options)
+        key = get_answer_keys([self.question.id])[self.question.id]
+
+        with self.assertNumQueries(0):
+            key = get_answer_keys([self.question.id])[self.question.id]
+            self.assertTrue(key.grade([b, a]))
+            self.assertFalse(key.grade([a]))
+            self.assertFalse(key.grade([a, b, c]))
+            self.assertIsNone(key.grade([a, c + 100]))
+            self.assertIsNone(key.grade([str(a)]))
+        self.assertEqual(key.correct_ids, [a, b])
+
+    def test_keys_follow_option_changes(self):
+        get_answer_keys([self.question.id])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.options[2].is_correct = True
+            self.options[2].save()
+        key = get_answer_keys([self.question.id])[self.question.id]
+        self.assertTrue(key.grade([o.id for o in self.options]))
+
+    def test_deleting_an_option_keeps_stored_selections(self):
+        a, b, c = self.options
+        user = User.objects.create_user(username="student", email="student@example.com", password="pass")
+        session = MockTestSession.objects.create(user=user, total_questions=1)
+        free_session = FreeMockTestSession.objects.create(user=user, total_questions=1)
+        key = get_answer_keys([self.question.id])[self.question.id]
+        selections = [[a.id, c.id], [b.id], [c.id], [a.id], []]
+        answers = [MockTestAnswer.objects.create(session=session, question=self.question, selected_mask=key.mask(ids)) for ids in selections]
+        free = FreeMockTestAnswer.objects.create(session=free_session, question=self.question, selected_mask=key.mask([b.id, c.id]))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            b.delete()
+
+        key = get_answer_keys([self.question.id])[self.question.id]
+        stored = [key.ids(MockTestAnswer.objects.get(pk=answer.pk).selected_mask) for answer in answers]
+        self.assertEqual(stored, [[a.id, c.id], [], [c.id], [a.id], []])
+        self.assertEqual(key.ids(FreeMockTestAnswer.objects.get(pk=free.pk).selected_mask), [c.id])
+
+    def test_deleting_several_options_at_once_keeps_stored_selections(self):
+        a, b, c = self.options
+        with self.captureOnCommitCallbacks(execute=True):
+            d = QuestionOption.objects.create(question=self.question, text="D")
+        session = MockTestSession.objects.create(
+            user=User.objects.create_user(username="student", email="student@example.com", password="pass"), total_questions=1,
+        )
+        key = get_answer_keys([self.question.id])[self.question.id]
+        selections = [[c.id, d.id], [a.id, d.id], [b.id], [c.id]]
+        answers = [MockTestAnswer.objects.create(session=session, question=self.question, selected_mask=key.mask(ids)) for ids in selections]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            QuestionOption.objects.filter(id__in=[a.id, b.id]).delete()
+
+        key = get_answer_keys([self.question.id])[self.question.id]
+        stored = [key.ids(MockTestAnswer.objects.get(pk=answer.pk).selected_mask) for answer in answers]
+        self.assertEqual(stored, [[c.id, d.id], [d.id], [], [c.id]])
+
+    def test_keys_follow_changes_made_by_another_worker(self):
+        a, b, c = (o.id for o in self.options)
+        get_answer_keys([self.question.id])
+
+        QuestionOption.objects.filter(id=c).update(is_correct=True)
+        ContentVersion.objects.update(version=F("version") + 1)
+        cache.delete(CONTENT_VERSION_KEY)
+
+        key = get_answer_keys([self.question.id])[self.question.id]
+        self.assertEqual(key.correct_ids, [a, b, c])
+
+
+@override_settings(MOCK_PAPER_POOL_SIZE=4, MOCK_PAPER_POOL_ASYNC=False)
+class PaperPoolTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        clear_papers()
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user(username="student", email="student@example.com", password="pass"))
+        with self.captureOnCommitCallbacks(execute=True):
+            for c, size in enumerate([20, 10]):
+                chapter = Chapter.objects.create(name=f"Chapter {c}")
+                for i in range(size):
+                    question = Question.objects.create(chapter=chapter, question_text=f"{c}.{i}", type="practice")
+                    QuestionOption.objects.create(question=question, text="Yes", is_correct=True)
+        self.addCleanup(clear_papers)
+
+    def test_start_pops_a_ready_paper(self):
+        self.assertEqual(refill_papers(), 4)
+
+        # existence check, session, answers, evaluation update
+        with self.assertNumQueries(4):
+            response = self.client.post("/mock-test/start/")
+
+        questions = response.data["data"]["questions"]
+        self.assertEqual(len({q["id"] for q in questions}), 24)
+        self.assertEqual(set(MockTestAnswer.objects.values_list("question_id", flat=True)), {q["id"] for q in questions})
+        self.assertEqual(paper_pool_stats()["papers"], 3)
+
+    def test_pool_is_dropped_when_content_changes(self):
+        refill_papers()
+        with self.captureOnCommitCallbacks(execute=True):
+            Question.objects.first().delete()
+
+        response = self.client.post("/mock-test/start/")
+        self.assertEqual(response.status_code, 200)
+        # the stale papers were thrown away and the pool refilled inline
+        self.assertEqual(paper_pool_stats()["papers"], 4)
+
+    def test_pool_is_dropped_when_another_worker_changes_content(self):
+        refill_papers()
+        ContentVersion.objects.update(version=F("version") + 1)
+        cache.delete(CONTENT_VERSION_KEY)
+
+        self.assertIsNone(take_paper(None))
+        self.assertEqual(paper_pool_stats()["version"], ContentVersion.objects.get().version)
+
+
+class FreeMockTestEngineTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user(username="student", email="student@example.com", password="pass"))
+        with self.captureOnCommitCallbacks(execute=True):
+            chapter = Chapter.objects.create(name="History")
+            for i in range(30):
+                question = Question.objects.create(chapter=chapter, question_text=f"Q{i}", type="freeMockTest")
+                QuestionOption.objects.create(question=question, text="Yes", is_correct=True)
+                QuestionOption.objects.create(question=question, text="No", is_correct=False)
+            Question.objects.create(chapter=chapter, question_text="Practice", type="practice")
+
+    def test_start_answer_and_finish(self):
+        data = self.client.post("/free-mock-tests/start/").data["data"]
+        self.assertEqual(len({q["id"] for q in data["questions"]}), 24)
+        self.assertFalse(Question.objects.filter(id__in=[q["id"] for q in data["questions"]], type="practice").exists())
+
+        question = data["questions"][0]
+        url = f"/free-mock-tests/{data['session_id']}/answer/"
+        self.client.post(url, {"question_id": question["id"], "selected_options": []}, format="json")
+
+        # answer row with ownership, update
+        with self.assertNumQueries(2):
+            response = self.client.post(url, {
+                "question_id": question["id"], "selected_options": question["correct_option_ids"],
+            }, format="json")
+        self.assertTrue(response.data["data"]["correct"])
+        self.assertEqual(self.client.post(url, {"question_id": 0, "selected_options": []}, format="json").status_code, 400)
+
+        response = self.client.post(f"/free-mock-tests/{data['session_id']}/finish/")
+        self.assertEqual(response.data["data"]["score"], round(1 / 24 * 100))
+
+    def test_other_users_session_is_not_found(self):
+        session_id = self.client.post("/free-mock-tests/start/").data["data"]["session_id"]
+        self.client.force_authenticate(User.objects.create_user(username="other", email="other@example.com", password="pass"))
+        response = self.client.post(f"/free-mock-tests/{session_id}/answer/", {"question_id": 1, "selected_options": []}, format="json")
+        self.assertEqual(response.status_code, 404)
+
+
+class PracticeSubmitTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="student", email="student@example.com", password="pass")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.chapter = Chapter.objects.create(name="History")
+            self.questions = []
+            for i in range(50):
+                question = Question.objects.create(chapter=self.chapter, question_text=f"Q{i}", type="practice", explanation=f"E{i}")
+                right = QuestionOption.objects.create(question=question, text="Yes", is_correct=True)
+                QuestionOption.objects.create(question=question, text="No", is_correct=False)
+                self.questions.append((question, right))
+
+    def test_grades_a_round_in_fixed_queries(self):
+        ChapterProgress.objects.create(user=self.user, chapter=self.chapter).completed_questions.add(self.questions[0][0])
+        answers = [
+            {"question_id": question.id, "selected_options": [right.id] if i % 2 else []}
+            for i, (question, right) in enumerate(self.questions[:40])
+        ]
+        answers.append({"question_id": 0, "selected_options": []})
+
+        # progress, questions, answer keys, completed ids, bulk insert,
+        # counter, percentage and practice total updates, reload
+        with self.assertNumQueries(9):
+            response = self.client.post("/practice/answer/", {"chapter_id": self.chapter.id, "answers": answers}, format="json")
+
+        data = response.data["data"]
+        self.assertEqual((data["correct_answers"], len(data["results"])), (20, 40))
+        self.assertEqual(data["results"][1]["explanation"], "E1")
+        self.assertEqual(data["completion_percentage"], 80.0)
+
+
+class PracticeChapterListTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="student", email="student@example.com", password="pass")
+        self.client = APIClient()
+
+    def make_chapters(self, count):
+        for c in range(count):
+            chapter = Chapter.objects.create(name=f"Chapter {c}")
+            for i in range(3):
+                Question.objects.create(chapter=chapter, question_text=f"Q{i}", type="practice")
+            Question.objects.create(chapter=chapter, question_text="Mock", type="freeMockTest")
+        return chapter
+
+    def test_query_count_is_constant(self):
+        self.client.force_authenticate(self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.make_chapters(2)
+        # chapters with annotated totals + progress
+        with self.assertNumQueries(2):
+            self.client.get("/practice/chapters/")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            last = self.make_chapters(10)
+        ChapterProgress.objects.create(user=self.user, chapter=last).completed_questions.add(last.questions.first())
+        with self.assertNumQueries(2):
+            response = self.client.get("/practice/chapters/")
+        data = response.data["data"]
+        self.assertEqual(len(data), 12)
+        self.assertEqual({chapter["total_questions"] for chapter in data}, {3})
+        self.assertEqual(data[0]["completion_percentage"], 0.0)
+        self.assertEqual(data[-1]["completion_percentage"], 33.33)
+
+        # Totals come from the content cache; only the progress is read
+        with self.assertNumQueries(1):
+            self.client.get("/practice/chapters/")
+
+    def test_totals_follow_content_changes(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            chapter = self.make_chapters(1)
+        data = self.client.get("/practice/chapters/").data["data"]
+        self.assertEqual(data[0]["total_questions"], 3)
+        self.assertNotIn("completion_percentage", data[0])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Question.objects.create(chapter=chapter, question_text="Q3", type="practice")
+        self.assertEqual(self.client.get("/practice/chapters/").data["data"][0]["total_questions"], 4)
+
+
+class PracticeQuestionListTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="student", email="student@example.com", password="pass")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.chapter = Chapter.objects.create(name="History")
+
+    def expected_body(self):
+        questions = practice_questions(self.chapter.id)
+        return JSONRenderer().render({
+            "success": True,
+            "message": "Practice questions retrieved successfully.",
+            "data": {"total": len(questions), "questions": QuestionSerializer(questions, many=True).data},
+        })
+
+    def test_stream_matches_rendered_response(self):
+        Question.objects.bulk_create([
+            Question(chapter=self.chapter, question_text=f"Q{i} – “quoted” ", type="practice", explanation=f"E{i}" if i % 2 else None)
+            for i in range(2 * CHUNK_SIZE + 1)
+        ])
+        first = Question.objects.filter(chapter=self.chapter).order_by("id").first()
+        first.image = "questions/map.png"
+        first.save()
+        QuestionOption.objects.bulk_create([
+            QuestionOption(question=question, text=text, is_correct=text == "Yes")
+            for question in Question.objects.filter(chapter=self.chapter)
+            for text in ("Yes", "No")
+        ])
+        QuestionGlossary.objects.create(question=first, title="Magna Carta", description="1215")
+        Question.objects.create(chapter=self.chapter, question_text="Mock", type="freeMockTest")
+        Question.objects.create(chapter=Chapter.objects.create(name="Civics"), question_text="Other", type="practice")
+
+        # count, one cursor over the questions, options + glossaries per chunk
+        with self.assertNumQueries(8):
+            response = self.client.get(f"/practice/chapters/{self.chapter.id}/question/")
+            body = b"".join(response.streaming_content)
+
+        self.assertEqual(response["Content-Type"], "application/json")
+        self.assertEqual(body, self.expected_body())
+        self.assertEqual(json.loads(body)["data"]["total"], 2 * CHUNK_SIZE + 1)
+
+    def test_empty_chapter(self):
+        response = self.client.get(f"/practice/chapters/{self.chapter.id}/question/")
+        self.assertEqual(b"".join(response.streaming_content), self.expected_body())
+
+
+class EvaluationViewTests(TestCase):
+    def test_practice_completion_is_one_row_read(self):
+        user = User.objects.create_user(username="student", email="student@example.com", password="pass")
+        client = APIClient()
+        client.force_authenticate(user)
+        history, civics, empty = (Chapter.objects.create(name=name) for name in ("History", "Civics", "Empty"))
+        questions = [Question.objects.create(chapter=history, question_text=f"Q{i}", type="practice") for i in range(4)]
+        Question.objects.create(chapter=civics, question_text="C", type="practice")
+        Question.objects.create(chapter=empty, question_text="Mock", type="freeMockTest")
+
+        ChapterProgress.objects.create(user=user, chapter=history).completed_questions.add(*questions[:3])
+        ChapterProgress.objects.create(user=user, chapter=civics)
+        ChapterProgress.objects.create(user=user, chapter=empty)
+
+        with self.assertNumQueries(1):
+            data = client.get("/evaluation/").data["data"]
+        self.assertEqual(data["PracticeCompleted"], 37.5)
+
+        # A new practice question changes the history chapter's percentage
+        with self.captureOnCommitCallbacks(execute=True):
+            Question.objects.create(chapter=history, question_text="Q4", type="practice")
+        self.assertEqual(client.get("/evaluation/").data["data"]["PracticeCompleted"], 30.0)
+
+        ChapterProgress.objects.filter(chapter=civics).delete()
+        self.assertEqual(client.get("/evaluation/").data["data"]["PracticeCompleted"], 60.0)
+
+
+class MockTestHistoryTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="student", email="student@example.com", password="pass")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        chapter = Chapter.objects.create(name="History")
+        questions = [Question.objects.create(chapter=chapter, question_text=f"Q{i}") for i in range(3)]
+        now = timezone.now()
+        for n in range(25):
+            session = MockTestSession.objects.create(user=self.user, total_questions=3, score=n, finished_at=now - timedelta(hours=n))
+            MockTestAnswer.objects.bulk_create([
+                MockTestAnswer(session=session, question=q, is_correct=i < n % 3) for i, q in enumerate(questions)
+            ])
+        MockTestSession.objects.create(user=self.user, total_questions=3)
+
+    def test_counts_are_annotated(self):
+        with self.assertNumQueries(1):
+            data = self.client.get("/mock-test/history/").data["data"]
+        self.assertEqual(len(data), 25)
+        self.assertEqual([(s["correct"], s["wrong"]) for s in data[:3]], [(0, 3), (1, 2), (2, 1)])
+
+    def test_cursor_pagination(self):
+        first = self.client.get("/mock-test/history/", {"cursor": ""}).data["data"]
+        self.assertEqual(len(first["sessions"]), 20)
+        second = self.client.get(first["next"]).data["data"]
+        self.assertEqual([s["score"] for s in second["sessions"]], [20, 21, 22, 23, 24])
+        self.assertIsNone(second["next"])
+
+
+@override_settings(MOCK_SELECTION_ENGINE="api.selection.RecencySelection")
+class RecencySelectionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="student", email="student@example.com", password="pass")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            for c, size in enumerate([32, 16]):
+                chapter = Chapter.objects.create(name=f"Chapter {c}")
+                for i in range(size):
+                    Question.objects.create(chapter=chapter, question_text=f"{c}.{i}", type="practice")
+
+    def paper(self):
+        response = self.client.post("/mock-test/start/")
+        return {q["id"] for q in response.data["data"]["questions"]}
+
+    def test_prefers_questions_not_seen(self):
+        first = self.paper()
+        second = self.paper()
+        self.assertEqual(len(first | second), 48)
+
+        # Exposure is rebuilt from the answer history when the cache is lost
+        cache.clear()
+        third = self.paper()
+        self.assertEqual(len(third), 24)
+        exposure = RecencySelection().get_exposure(self.user, get_question_pool())
+        self.assertEqual(len(exposure["sessions"]), 3)
+        self.assertEqual(bin(exposure["seen"]).count("1"), 48)
+
+
+@override_settings(MOCK_SESSION_STATE="cache")
+class LiveSessionStateTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username="student", email="student@example.com", password="pass")
+        self.client.force_authenticate(self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            chapter = Chapter.objects.create(name="History")
+            self.session = MockTestSession.objects.create(user=self.user, total_questions=3)
+            self.questions = []
+            for i in range(3):
+                question = Question.objects.create(chapter=chapter, question_text=f"Q{i}", type="practice")
+                right = QuestionOption.objects.create(question=question, text="Yes", is_correct=True)
+                QuestionOption.objects.create(question=question, text="No", is_correct=False)
+                MockTestAnswer.objects.create(session=self.session, question=question)
+                self.questions.append((question, right))
+
+    def answer(self, question, option_ids):
+        return self.client.post(f"/mock-test/{self.session.id}/answer/", {
+            "question": question.id, "selected_choice_ids": option_ids,
+        }, format="json")
+
+    def test_answers_stay_in_cache_until_finish(self):
+        (first, right), (second, _), (third, _) = self.questions
+        self.assertTrue(self.answer(first, [right.id]).data["data"]["correct"])
+
+        with self.assertNumQueries(0):
+            self.assertFalse(self.answer(second, []).data["data"]["correct"])
+        self.assertEqual(self.answer(third, [0]).status_code, 400)
+        self.assertFalse(MockTestAnswer.objects.filter(is_correct=True).exists())
+
+        response = self.client.post(f"/mock-test/{self.session.id}/finish/")
+        self.assertEqual(response.data["data"]["correct"], 1)
+        self.assertEqual(MockTestAnswer.objects.get(question=first).selected_mask, 1)
+
+    def test_deleted_option_shifts_cached_selections(self):
+        (first, right), _, _ = self.questions
+        wrong = first.options.get(is_correct=False)
+        self.answer(first, [wrong.id])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            right.delete()
+        self.client.post(f"/mock-test/{self.session.id}/finish/")
+
+        key = get_answer_keys([first.id])[first.id]
+        self.assertEqual(key.ids(MockTestAnswer.objects.get(question=first).selected_mask), [wrong.id])
+
+    def test_flush_command_and_ownership(self):
+        (first, right), _, _ = self.questions
+        self.answer(first, [right.id])
+        call_command("flush_mock_sessions", stdout=open("/dev/null", "w"))
+        self.assertTrue(MockTestAnswer.objects.get(question=first).is_correct)
+
+        self.client.force_authenticate(User.objects.create_user(username="other", email="other@example.com", password="pass"))
+        self.assertEqual(self.answer(first, []).status_code, 404)
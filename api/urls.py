@@ -51,6 +51,8 @@ urlpatterns = [
     path('chapters/', views.ChapterListView.as_view(), name="chapters"),
     path('chapters/<int:pk>/', views.ChapterLessonsView.as_view(), name="chapters"),
     path('chapters/<int:chapter_id>/<int:lesson_id>/', views.ChapterLessonDetailView.as_view(), name="chapter-lesson-detail"),
+    path('chapters/<int:pk>/bundle/', views.ChapterBundleView.as_view(), name="chapter-bundle"),
+    path('sync/', views.SyncView.as_view(), name="sync"),
 
     #Guide and support
     path('guide/', views.GuideSupportView.as_view(), name='guide'),
@@ -98,6 +100,7 @@ urlpatterns = [
     path('lessons/count/', views.LessonCountView.as_view(), name='lesson-count'),
     path('mock-tests/count/', views.MockTestCount.as_view(), name='mock-test-count'),
     path('subscription/count/', views.UserSubscriptionCount.as_view(), name='subscription-count'),
+    path('metrics/cache/', views.CacheMetricsView.as_view(), name='cache-metrics'),
 
     path('upload-study-csv/', views.ImportLessonContentCSVView.as_view(), name='upload_csv'),
     path("upload-guidesupport-csv/", views.ImportGuideSupportCSVView.as_view(), name="upload_guidesupport_csv"),
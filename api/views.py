@@ -29,6 +29,25 @@ from django.contrib.auth.password_validation import validate_password
 from django.db.models import Prefetch
 from collections import defaultdict
 from django.conf import settings
+from .catalog import build_chapter_catalog, lesson_progress_state, build_practice_chapters, practice_completion_by_chapter
+from main.content_cache import get_or_build, content_cache_stats
+from main.conditional import conditional_content
+from .snapshots import get_lesson_page, render_lesson_page
+from .pagination import ContentCursorPagination, HistoryCursorPagination, is_cursor_request
+from .bundles import build_chapter_bundle
+from django.utils.cache import get_conditional_response
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+import json
+from main.changelog import iter_sync_stream, record_changes
+from . import hotcache
+from main.progress import mark_contents_completed, mark_questions_completed
+from main.evaluation import add_to_evaluation, overall_practice_completion
+from .question_pool import NotEnoughQuestions
+from .paper_pool import paper_pool_stats, PAPER_SIZE
+from .grading import get_answer_keys, selected_option_ids, AnswerError
+from .session_engine import mock_tests, free_mock_tests
+from .serializers import question_for_test_data
+from .practice_stream import iter_practice_questions
 
 #  Create your views here.
 
@@ -353,7 +372,7 @@ class UserEvaluationView(APIView):
 
     def get(self, request):
         try:
-            evaluation = UserEvaluation.objects.get(user=request.user.profile)
+            evaluation = UserEvaluation.objects.get(user__user=request.user)
         except UserEvaluation.DoesNotExist:
             return Response({
                 "success": False,
@@ -361,12 +380,9 @@ class UserEvaluationView(APIView):
                 "data": None
             }, status=status.HTTP_404_NOT_FOUND)
 
-        try:
-            total = int(evaluation.QuestionAnswered or 0)
-            correct = int(evaluation.CorrectAnswered or 0)
-            wrong = int(evaluation.WrongAnswered or 0)
-        except ValueError:
-            total = correct = wrong = 0
+        total = evaluation.QuestionAnswered
+        correct = evaluation.CorrectAnswered
+        wrong = evaluation.WrongAnswered
 
         if total > 0:
             correct_percentage = round((correct / total) * 100, 2)
@@ -374,24 +390,10 @@ class UserEvaluationView(APIView):
         else:
             correct_percentage = wrong_percentage = 0.0
 
-        user = request.user
-        chapter_progress_qs = ChapterProgress.objects.filter(user=user).select_related("chapter")
-
-        valid_progress = [
-            p for p in chapter_progress_qs
-            if p.chapter.questions.filter(type="practice").exists()
-        ]
-
-        if valid_progress:
-            total_percent = sum(p.completion_percentage for p in valid_progress)
-            overall_practice_completion = round(total_percent / len(valid_progress), 2)
-        else:
-            overall_practice_completion = 0.0
-
         response_data = {
             "MockTestTaken": evaluation.MockTestTaken,
             "LeftMockTest": evaluation.LeftMockTest,
-            "PracticeCompleted": overall_practice_completion,
+            "PracticeCompleted": overall_practice_completion(evaluation),
             "QuestionAnswered": total,
             "CorrectAnsweredPercentage": correct_percentage,
             "WrongAnsweredPercentage": wrong_percentage,
@@ -715,6 +717,21 @@ class UserSubscriptionCount(APIView):
             }
         }, status=status.HTTP_200_OK)
 
+
+class CacheMetricsView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response({
+            "success": True,
+            "message": "Cache metrics fetched successfully.",
+            "data": {
+                "content_cache": content_cache_stats(),
+                "hot_cache": hotcache.hot_cache_stats(),
+                "paper_pool": paper_pool_stats()
+            }
+        }, status=status.HTTP_200_OK)
+
 # --------------------------------------------------Admin details view--------------------------------------s
 
 class HomePageDetailsAdminView(generics.RetrieveUpdateDestroyAPIView):
@@ -1101,63 +1118,40 @@ class SubscriptionPlanDetailsAdminView(generics.RetrieveUpdateDestroyAPIView):
 # --------------------------------------------------------Study section--------------------------------------
 
 class HomePageView(APIView):
+    @conditional_content()
     def get(self, request):
+        return hotcache.cached_response(request, hotcache.get_or_build('home', self.render_home))
+
+    @staticmethod
+    def render_home():
         home = HomePage.objects.last()
         if home:
             serializer = HomePageModelSerializer(home)
-            return Response({
+            return hotcache.render({
                 "success": True,
                 "message": "Home page content retrieved successfully.",
                 "data": serializer.data
-            }, status=status.HTTP_200_OK)
+            }, status.HTTP_200_OK)
 
-        return Response({
+        return hotcache.render({
             "success": False,
             "message": "No home page content found.",
             "data": None
-        }, status=status.HTTP_404_NOT_FOUND)
+        }, status.HTTP_404_NOT_FOUND)
 
 
 
 class ChapterListView(APIView):
     permission_classes = [AllowAny]  # Allow both authenticated and unauthenticated users
 
+    @conditional_content(user_state=lesson_progress_state)
     def get(self, request):
-        chapters = Chapter.objects.all().order_by('id')
-        data = []
-
-        for chapter in chapters:
-            lessons = Lesson.objects.filter(chapter=chapter).order_by('id')
-            total_lessons = lessons.count()
-
-            completed_lessons = 0
-            lesson_ids = [str(lesson.name) for lesson in lessons]
-
-            # Only calculate progress if the user is authenticated
-            show_progress = request.user and not isinstance(request.user, AnonymousUser)
-
-            if show_progress:
-                for lesson in lessons:
-                    progress = LessonProgress.objects.filter(user=request.user, lesson=lesson).first()
-                    if progress and progress.completion_percentage == 100.0:
-                        completed_lessons += 1
-                chapter_completion = (completed_lessons / total_lessons * 100) if total_lessons > 0 else 0.0
-                completion_percentage = round(chapter_completion, 2)
-            else:
-                completion_percentage = None  # Or omit the field entirely if you prefer
-
-            chapter_data = {
-                'chapter_id': chapter.id,
-                'name': chapter.name,
-                'description': chapter.description,
-                'created': chapter.created,
-                'lessons': lesson_ids,
-            }
-
-            if show_progress:
-                chapter_data['completion_percentage'] = completion_percentage
-
-            data.append(chapter_data)
+        # Only calculate progress if the user is authenticated
+        show_progress = request.user and not isinstance(request.user, AnonymousUser)
+        if show_progress:
+            data = build_chapter_catalog(request.user)
+        else:
+            data = get_or_build('chapters', build_chapter_catalog)
 
         return Response({
             "success": True,
@@ -1170,27 +1164,22 @@ class ChapterListView(APIView):
 class ChapterLessonsView(APIView):
     permission_classes = [AllowAny]  # Allow all users to access
 
+    @conditional_content(user_state=lesson_progress_state)
     def get(self, request, pk):
-        chapter = get_object_or_404(Chapter, id=pk)
-        lessons = Lesson.objects.filter(chapter=chapter).reverse()
-        data = []
-
         show_progress = request.user and not isinstance(request.user, AnonymousUser)
 
-        for lesson in lessons:
-            lesson_data = {
-                'lesson_id': lesson.id,
-                'name': lesson.name,
-                'title': lesson.title,
-                'created': lesson.created,
-            }
-
-            if show_progress:
-                progress = LessonProgress.objects.filter(user=request.user, lesson=lesson).first()
-                percentage = progress.completion_percentage if progress else 0.0
+        if show_progress:
+            data = self.build_lessons(pk)
+            progress = dict(
+                LessonProgress.objects
+                .filter(user=request.user, lesson__chapter_id=pk)
+                .values_list('lesson_id', 'completion_percentage')
+            )
+            for lesson_data in data:
+                percentage = progress.get(lesson_data['lesson_id'], 0.0)
                 lesson_data['completion_percentage'] = round(percentage, 2)
-
-            data.append(lesson_data)
+        else:
+            data = get_or_build('chapter-lessons', lambda: self.build_lessons(pk), pk)
 
         return Response({
             "success": True,
@@ -1198,15 +1187,28 @@ class ChapterLessonsView(APIView):
             "data": data
         }, status=status.HTTP_200_OK)
 
+    @staticmethod
+    def build_lessons(pk):
+        chapter = get_object_or_404(Chapter, id=pk)
+        lessons = Lesson.objects.filter(chapter=chapter).reverse()
+        return [
+            {
+                'lesson_id': lesson.id,
+                'name': lesson.name,
+                'title': lesson.title,
+                'created': lesson.created,
+            }
+            for lesson in lessons
+        ]
+
 
 
 
 class ChapterLessonDetailView(APIView):
     permission_classes = [AllowAny]
 
+    @conditional_content(skip_authenticated=True)
     def get(self, request, chapter_id, lesson_id):
-        lesson = get_object_or_404(Lesson, id=lesson_id, chapter_id=chapter_id)
-
         try:
             step = int(request.query_params.get('step', 0))
         except (TypeError, ValueError):
@@ -1216,34 +1218,77 @@ class ChapterLessonDetailView(APIView):
                 "data": None
             }, status=status.HTTP_400_BAD_REQUEST)
 
-        PAGE_SIZE = 10
-        start_index = step * PAGE_SIZE
-        end_index = start_index + PAGE_SIZE
+        if is_cursor_request(request):
+            return self.get_cursor_page(request, chapter_id, lesson_id)
 
-        lesson_qs = LessonContent.objects.filter(lesson=lesson).order_by('id')
-        total = lesson_qs.count()
-
-        if start_index >= total:
+        # Pre-rendered page: one cache read instead of count + slice + serializer
+        page = get_lesson_page(lesson_id, step)
+        if page is None:
+            get_object_or_404(Lesson, id=lesson_id, chapter_id=chapter_id)
             return Response({
                 "success": False,
                 "message": "No content available for this page.",
                 "data": None
             }, status=status.HTTP_404_NOT_FOUND)
 
-        current_page_items = lesson_qs[start_index:end_index]
+        if page["chapter_id"] != chapter_id:
+            raise Http404
 
         completion_percentage = None  # Default for anonymous users
 
         if request.user.is_authenticated:
             user = request.user
-            progress_obj, _ = LessonProgress.objects.get_or_create(user=user, lesson=lesson)
+            progress_obj, _ = LessonProgress.objects.get_or_create(user=user, lesson_id=lesson_id)
+            completion_percentage = mark_contents_completed(progress_obj, page["ids"], page["total"])
 
-            for content in current_page_items:
-                if content not in progress_obj.completed_contents.all():
-                    progress_obj.completed_contents.add(content)
+        if request.accepted_renderer.format != 'json':
+            return Response({
+                "success": True,
+                "message": "Lesson content retrieved successfully.",
+                "data": {
+                    "step": step,
+                    "total_items": page["total"],
+                    "completion_percentage": completion_percentage,
+                    "content": json.loads(page["content"])
+                }
+            }, status=status.HTTP_200_OK)
 
-            progress_obj.update_completion()
-            completion_percentage = progress_obj.completion_percentage
+        return HttpResponse(
+            render_lesson_page(step, page, completion_percentage),
+            content_type='application/json',
+            status=status.HTTP_200_OK,
+        )
+
+    def get_cursor_page(self, request, chapter_id, lesson_id):
+        lesson = get_object_or_404(Lesson, id=lesson_id, chapter_id=chapter_id)
+
+        paginator = ContentCursorPagination()
+        lesson_qs = (
+            LessonContent.objects
+            .filter(lesson=lesson)
+            .select_related('lesson__chapter')
+            .prefetch_related(Prefetch('glossaries', queryset=Glossary.objects.order_by('id')))
+        )
+        current_page_items = paginator.paginate_queryset(lesson_qs, request, view=self)
+
+        if not current_page_items:
+            return Response({
+                "success": False,
+                "message": "No content available for this page.",
+                "data": None
+            }, status=status.HTTP_404_NOT_FOUND)
+
+        total = get_or_build(
+            'lesson-content-count',
+            lambda: LessonContent.objects.filter(lesson_id=lesson_id).count(),
+            lesson_id,
+        )
+
+        completion_percentage = None  # Default for anonymous users
+
+        if request.user.is_authenticated:
+            progress_obj, _ = LessonProgress.objects.get_or_create(user=request.user, lesson=lesson)
+            completion_percentage = mark_contents_completed(progress_obj, [item.id for item in current_page_items], total)
 
         serializer = LessonContentModelSerializer(current_page_items, many=True)
 
@@ -1251,9 +1296,10 @@ class ChapterLessonDetailView(APIView):
             "success": True,
             "message": "Lesson content retrieved successfully.",
             "data": {
-                "step": step,
                 "total_items": total,
                 "completion_percentage": completion_percentage,
+                "next": paginator.get_next_link(),
+                "prev": paginator.get_previous_link(),
                 "content": serializer.data
             }
         }, status=status.HTTP_200_OK)
@@ -1261,12 +1307,64 @@ class ChapterLessonDetailView(APIView):
 
 
     
+class ChapterBundleView(APIView):
+    """
+    GET /chapters/<pk>/bundle/
+    Gzip-compressed offline bundle of the chapter (see api/bundles.py).
+    The ETag is the content digest, so unchanged bundles answer 304.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, pk):
+        chapter = get_object_or_404(Chapter, id=pk)
+        bundle = build_chapter_bundle(chapter)
+        etag = f'"{bundle.digest}"'
+
+        not_modified = get_conditional_response(request, etag=etag)
+        if not_modified is not None:
+            return not_modified
+
+        with bundle.file.open('rb') as fh:
+            response = HttpResponse(fh.read(), content_type='application/gzip')
+        response['ETag'] = etag
+        response['Content-Disposition'] = f'attachment; filename="{bundle.file.name.rsplit("/", 1)[-1]}"'
+        return response
+
+
+class SyncView(APIView):
+    """
+    GET /sync/?since=<version>
+    Streams the content rows changed since the client's version (see
+    main/changelog.py). Without ``since``, or when it predates the last
+    compaction, every row is sent with "reset": true.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        since = request.query_params.get('since')
+        if since is not None:
+            try:
+                since = int(since)
+            except ValueError:
+                return Response({
+                    "success": False,
+                    "message": "Invalid 'since' parameter.",
+                    "data": {}
+                }, status=status.HTTP_400_BAD_REQUEST)
+
+        response = StreamingHttpResponse(iter_sync_stream(since), content_type='application/json')
+        response['Cache-Control'] = 'no-store'
+        return response
+
+
+
 # -----------------------------------------------------Guides & Support section-------------------------------------
     
 class GuideSupportView(APIView):
     """
     GET /guides/
     """
+    @conditional_content()
     def get(self, request):
         guides = GuidesSupport.objects.all().order_by('id')
         serializer = GuidesSupportModelSerializer(guides, many=True)
@@ -1282,6 +1380,7 @@ class GuideSupportView(APIView):
 class GuideSupportContentView(APIView):
     PAGE_SIZE = 10
 
+    @conditional_content()
     def get(self, request, guide_id):
         try:
             step = int(request.query_params.get("step", 0))
@@ -1297,21 +1396,40 @@ class GuideSupportContentView(APIView):
 
         contents_qs = GuideSupportContent.objects.filter(
             guide_id=guide_id
-        ).order_by("id")
+        ).prefetch_related("glossaries").order_by("id")
 
-        total = contents_qs.count()
-        start = step * self.PAGE_SIZE
-        end = start + self.PAGE_SIZE
+        total = get_or_build(
+            'guide-content-count',
+            lambda: GuideSupportContent.objects.filter(guide_id=guide_id).count(),
+            guide_id,
+        )
+
+        if is_cursor_request(request):
+            paginator = ContentCursorPagination()
+            current_items = paginator.paginate_queryset(contents_qs, request, view=self)
+            page_data = {
+                "title": title,
+                "total_items": total,
+                "next": paginator.get_next_link(),
+                "prev": paginator.get_previous_link(),
+            }
+        else:
+            start = step * self.PAGE_SIZE
+            end = start + self.PAGE_SIZE
+            current_items = contents_qs[start:end] if start < total else []
+            page_data = {
+                "title": title,
+                "step": step,
+                "total_items": total,
+            }
 
-        if start >= total:
+        if not current_items:
             return Response({
                 "success": False,
                 "message": "No content available for this page.",
                 "data": None
             }, status=status.HTTP_404_NOT_FOUND)
 
-        current_items = contents_qs[start:end]
-
         content_data = []
         for item in current_items:
             content_data.append({
@@ -1330,15 +1448,12 @@ class GuideSupportContentView(APIView):
                 ]
             })
 
+        page_data["content"] = content_data
+
         return Response({
             "success": True,
             "message": "Guide content retrieved successfully.",
-            "data": {
-                "title": title,
-                "step": step,
-                "total_items": total,
-                "content": content_data
-            }
+            "data": page_data
         }, status=status.HTTP_200_OK)
 
 
@@ -1359,13 +1474,17 @@ class SubscriptionPlanViewSet(viewsets.ReadOnlyModelViewSet):
     def list(self, request, *args, **kwargs):
         """
         Overriding the default list method to match the response structure.
+        The rendered list is kept in the per-worker hot cache.
         """
-        response_data = super().list(request, *args, **kwargs)
-        return Response({
-            "success": True,
-            "message": "Subscription plans retrieved successfully.",
-            "data": response_data.data
-        }, status=status.HTTP_200_OK)
+        def render_plans():
+            response_data = super(SubscriptionPlanViewSet, self).list(request, *args, **kwargs)
+            return hotcache.render({
+                "success": True,
+                "message": "Subscription plans retrieved successfully.",
+                "data": response_data.data
+            }, status.HTTP_200_OK)
+
+        return hotcache.cached_response(request, hotcache.get_or_build('subscription-plans', render_plans))
 
 
 class UserSubscriptionViewSet(viewsets.GenericViewSet):
@@ -1455,9 +1574,6 @@ class UserSubscriptionViewSet(viewsets.GenericViewSet):
                     evaluation = UserEvaluation.objects.create(
                         user=profile,
                         PracticeCompleted='0',
-                        QuestionAnswered='0',
-                        CorrectAnswered='0',
-                        WrongAnswered='0'
                     )
 
                 evaluation.LeftMockTest = 'Unlimited'
@@ -1512,29 +1628,15 @@ class PracticeChapterList(APIView):
         user = request.user
         is_authenticated = user and not isinstance(user, AnonymousUser)
 
-        chapters = Chapter.objects.all().order_by('created')[::1]
-        data = []
-
-        for chapter in chapters:
-            total_questions = Question.objects.filter(chapter=chapter, type="practice").count()
+        # Question totals are shared by everyone until the content changes
+        data = get_or_build('practice-chapters', build_practice_chapters)
 
-            chapter_data = {
-                'id': chapter.id,
-                'name': chapter.name,
-                'description': chapter.description,
-                'total_questions': total_questions,
-            }
-
-            if is_authenticated:
-                try:
-                    progress = ChapterProgress.objects.get(user=user, chapter=chapter)
-                    completion_percentage = round(progress.completion_percentage, 2)
-                except ChapterProgress.DoesNotExist:
-                    completion_percentage = 0.0
-
-                chapter_data['completion_percentage'] = completion_percentage
-
-            data.append(chapter_data)
+        if is_authenticated:
+            completion = practice_completion_by_chapter(user)
+            data = [
+                {**chapter_data, 'completion_percentage': round(completion.get(chapter_data['id'], 0.0), 2)}
+                for chapter_data in data
+            ]
 
         return Response({
             "success": True,
@@ -1585,25 +1687,8 @@ class PracticeQuestionListView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request, chapter_id):
-        questions = (
-            Question.objects
-            .filter(type="practice", chapter_id=chapter_id)
-            .order_by("id")
-            .prefetch_related(
-                Prefetch("options", queryset=QuestionOption.objects.order_by("id")),
-                Prefetch("glossary", queryset=QuestionGlossary.objects.order_by("id")),
-            )
-        )
-
-        serialized = QuestionSerializer(questions, many=True).data
-        return Response({
-            "success": True,
-            "message": "Practice questions retrieved successfully.",
-            "data": {
-                "total": len(serialized),
-                "questions": serialized
-            }
-        }, status=status.HTTP_200_OK)
+        # Streamed chunk by chunk; same bytes as rendering the whole list
+        return StreamingHttpResponse(iter_practice_questions(chapter_id), content_type='application/json')
 
 
 
@@ -1637,35 +1722,50 @@ class SubmitAnswersView(APIView):
 
         progress_obj, _ = ChapterProgress.objects.get_or_create(user=user, chapter_id=chapter_id)
 
+        # All referenced questions of the chapter in one query, graded in memory
+        question_ids = set()
+        for ans in answers:
+            if isinstance(ans, dict):
+                try:
+                    question_ids.add(int(ans.get("question_id")))
+                except (TypeError, ValueError):
+                    pass
+        explanations = dict(
+            Question.objects
+            .filter(id__in=question_ids, type="practice", chapter_id=chapter_id)
+            .values_list('id', 'explanation')
+        )
+        answer_keys = get_answer_keys(explanations)
+
         results = []
         correct_count = 0
 
         for ans in answers:
+            if not isinstance(ans, dict):
+                continue
             question_id = ans.get("question_id")
             selected = set(ans.get("selected_options", []))
 
             try:
-                question = Question.objects.get(id=question_id, type="practice", chapter_id=chapter_id)
-            except Question.DoesNotExist:
+                key = answer_keys[int(question_id)]
+            except (KeyError, TypeError, ValueError):
                 continue  # skip invalid question
 
-            correct_set = set(question.options.filter(is_correct=True).values_list('id', flat=True))
+            correct_set = set(key.correct_ids)
             is_correct = selected == correct_set
 
-            if question not in progress_obj.completed_questions.all():
-                progress_obj.completed_questions.add(question)
-
             results.append({
                 "question_id": question_id,
                 "is_correct": is_correct,
                 "correct_options": list(correct_set),
                 "selected_options": list(selected),
-                "explanation": question.explanation,
+                "explanation": explanations[int(question_id)],
             })
 
             if is_correct:
                 correct_count += 1
 
+        mark_questions_completed(progress_obj, answer_keys)
         progress_obj.update_completion()
 
         return Response({
@@ -1728,114 +1828,48 @@ class MockTestHomeViewSet(APIView):
 
 class MockTestViewSet(viewsets.ViewSet):
     permission_classes = [IsAuthenticated]
+    engine = mock_tests
 
     @action(detail=False, methods=['get', 'post'])
     def start(self, request):
-        total_questions = 24
+        total_questions = PAPER_SIZE
 
-        # 1. Count total practice questions by chapter
-        chapter_qs_counts = {}
-        total_available = 0
-        for ch in Chapter.objects.all():
-            count = Question.objects.filter(chapter=ch, type="practice").count()
-            if count > 0:
-                chapter_qs_counts[ch.id] = count
-                total_available += count
-
-        if total_available < total_questions:
+        # 1. Pick the paper and create session + answers
+        try:
+            session, paper = self.engine.start(request, total_questions)
+        except NotEnoughQuestions as exc:
             return Response({
                 "success": False,
-                "message": f"Not enough practice questions across all chapters. Found {total_available}, need {total_questions}.",
+                "message": f"Not enough practice questions across all chapters. Found {exc.available}, need {total_questions}.",
                 "data": None
             }, status=status.HTTP_400_BAD_REQUEST)
 
-        # 2. Calculate proportional allocation (raw decimals)
-        raw_counts = {}
-        chapter_counts = {}
-        for ch_id, count in chapter_qs_counts.items():
-            raw = (count / total_available) * total_questions
-            raw_counts[ch_id] = raw
-            chapter_counts[ch_id] = int(raw)  # start with floor()
-
-        # 3. Distribute rounding remainder based on fractional part
-        allocated = sum(chapter_counts.values())
-        remainder = total_questions - allocated
-        if remainder > 0:
-            sorted_chapters = sorted(
-                raw_counts.items(),
-                key=lambda x: (x[1] - int(x[1]), x[1]),  # fractional part, then bigger weight
-                reverse=True
-            )
-            for ch_id, _ in sorted_chapters[:remainder]:
-                chapter_counts[ch_id] += 1
-
-        # 4. Select random questions chapter-wise
-        selected_questions = []
-        for ch_id, count in chapter_counts.items():
-            qs = list(
-                Question.objects.filter(type="practice", chapter_id=ch_id)
-                .prefetch_related(
-                    Prefetch("options", queryset=QuestionOption.objects.order_by("id")),
-                    Prefetch("glossary", queryset=QuestionGlossary.objects.order_by("id")),
-                )
-            )
-            if len(qs) < count:
-                return Response({
-                    "success": False,
-                    "message": f"Not enough questions in Chapter {ch_id}. Need {count}, found {len(qs)}.",
-                    "data": None
-                }, status=status.HTTP_400_BAD_REQUEST)
-
-            selected_questions.extend(random.sample(qs, count))
-
-        # 5. Create session + answers
-        session = MockTestSession.objects.create(user=request.user, total_questions=total_questions)
-        MockTestAnswer.objects.bulk_create([
-            MockTestAnswer(session=session, question=q) for q in selected_questions
-        ])
-
-        serialized = QuestionForTestSerializer(
-            selected_questions, many=True, context={"request": request}
-        ).data
+        # 2. Update evaluation
+        add_to_evaluation(request.user, MockTestTaken=1)
 
-        # 6. Update evaluation
-        profile = request.user.profile
-        evaluation, _ = UserEvaluation.objects.get_or_create(user=profile)
-        evaluation.MockTestTaken += 1
-        evaluation.save(update_fields=['MockTestTaken'])
+        print("Chapter distribution:", paper.chapter_counts)  # Debugging log
 
-        print("Chapter distribution:", chapter_counts)  # Debugging log
-
-        # 7. Return response
+        # 3. Return response
         return Response({
             "success": True,
             "message": "Mock test session started successfully.",
             "data": {
                 "session_id": session.id,
-                "questions": serialized,
+                "questions": paper.questions,
 
             }
         }, status=status.HTTP_200_OK)
 
-
     def retrieve(self, request, pk=None):
-        session = get_object_or_404(MockTestSession, pk=pk, user=request.user)
-
-        answers = (
-            session.answers
-            .select_related("question")
-            .prefetch_related(
-                "selected_choices",
-                Prefetch("question__options", queryset=QuestionOption.objects.order_by("id")),
-                Prefetch("question__glossary", queryset=QuestionGlossary.objects.order_by("id")),
-            )
-        )
+        session = self.engine.get_session(pk, request.user)
+        answers = self.engine.load_answers(session)
+        answer_keys = get_answer_keys(a.question_id for a in answers)
 
         data = []
         for a in answers:
             data.append({
-                "question": QuestionForTestSerializer(a.question, context={"request": request}).data,
-                "selected_choices": list(a.selected_choices.values_list("id", flat=True)),
+                "question": question_for_test_data(a.question, request),
+                "selected_choices": selected_option_ids(a, answer_keys[a.question_id]),
                 "is_correct": a.is_correct
             })
 
@@ -1850,11 +1884,11 @@ class MockTestViewSet(viewsets.ViewSet):
 
     @action(detail=True, methods=['post'])
     def answer(self, request, pk=None):
-        session = get_object_or_404(MockTestSession, pk=pk, user=request.user)
         question_id = request.data.get('question')
         choice_ids = request.data.get('selected_choice_ids', [])
 
         if question_id is None or not isinstance(choice_ids, list):
+            self.engine.get_session(pk, request.user)
             return Response({
                 "success": False,
                 "message": 'Both "question" and "selected_choice_ids" are required.',
@@ -1862,55 +1896,31 @@ class MockTestViewSet(viewsets.ViewSet):
             }, status=status.HTTP_400_BAD_REQUEST)
 
         try:
-            answer = MockTestAnswer.objects.get(session=session, question_id=question_id)
-        except MockTestAnswer.DoesNotExist:
+            is_correct = self.engine.answer(pk, request.user, question_id, choice_ids)
+        except AnswerError as exc:
             return Response({
                 "success": False,
-                "message": 'Question not found in this session.',
+                "message": str(exc),
                 "data": None
             }, status=status.HTTP_400_BAD_REQUEST)
 
-        valid_choice_ids = set(answer.question.options.values_list('id', flat=True))
-        if not set(choice_ids).issubset(valid_choice_ids):
-            return Response({
-                "success": False,
-                "message": 'One or more choices are invalid for this question.',
-                "data": None
-            }, status=status.HTTP_400_BAD_REQUEST)
-
-        answer.selected_choices.set(choice_ids)
-        correct_ids = set(answer.question.options.filter(is_correct=True).values_list('id', flat=True))
-        answer.is_correct = set(choice_ids) == correct_ids
-        answer.save()
-
         return Response({
             "success": True,
             "message": 'Answer submitted successfully.',
             "data": {
-                'correct': answer.is_correct
+                'correct': is_correct
             }
         })
         
 
     @action(detail=True, methods=['post'])
     def finish(self, request, pk=None):
-        session = get_object_or_404(MockTestSession, pk=pk, user=request.user)
-        total = session.answers.count()
-        correct = session.answers.filter(is_correct=True).count()
+        session = self.engine.get_session(pk, request.user)
+        total, correct = self.engine.finish(session)
         wrong = total - correct
 
-        session.score = round((correct / total) * 100)
-        session.finished_at = timezone.now()
-        session.save()
-
         # Update UserEvaluation
-        profile = request.user.profile
-        evaluation, _ = UserEvaluation.objects.get_or_create(user=profile)
-
-        evaluation.QuestionAnswered = str(int(evaluation.QuestionAnswered or "0") + total)
-        evaluation.CorrectAnswered = str(int(evaluation.CorrectAnswered or "0") + correct)
-        evaluation.WrongAnswered = str(int(evaluation.WrongAnswered or "0") + wrong)
-        evaluation.save(update_fields=['QuestionAnswered', 'CorrectAnswered', 'WrongAnswered'])
+        add_to_evaluation(request.user, QuestionAnswered=total, CorrectAnswered=correct, WrongAnswered=wrong)
 
         return Response({
             "success": True,
@@ -1920,7 +1930,21 @@ class MockTestViewSet(viewsets.ViewSet):
 
     @action(detail=False, methods=['get'])
     def history(self, request):
-        sessions = MockTestSession.objects.filter(user=request.user, finished_at__isnull=False).order_by('-finished_at')
+        sessions = self.engine.history(request.user)
+
+        if is_cursor_request(request):
+            paginator = HistoryCursorPagination()
+            page = paginator.paginate_queryset(sessions, request, view=self)
+            return Response({
+                "success": True,
+                "message": "Mock test history retrieved successfully.",
+                "data": {
+                    "next": paginator.get_next_link(),
+                    "prev": paginator.get_previous_link(),
+                    "sessions": MockTestResultSerializer(page, many=True).data
+                }
+            })
+
         return Response({
             "success": True,
             "message": "Mock test history retrieved successfully.",
@@ -1929,7 +1953,7 @@ class MockTestViewSet(viewsets.ViewSet):
 
     @action(detail=True, methods=['post'])
     def submit_all_answers(self, request, pk=None):
-        session = get_object_or_404(MockTestSession, pk=pk, user=request.user)
+        session = self.engine.get_session(pk, request.user)
         submitted_answers = request.data.get('answers', [])
 
         if not isinstance(submitted_answers, list):
@@ -1939,46 +1963,15 @@ class MockTestViewSet(viewsets.ViewSet):
                 "data": None
             }, status=status.HTTP_400_BAD_REQUEST)
 
-        correct_count = 0
-        total = session.answers.count()
-
-        for item in submitted_answers:
-            question_id = item.get('question_id')
-            choice_ids = item.get('selected_options', [])
-
-            if not question_id or not isinstance(choice_ids, list):
-                continue  # Skip invalid item
-
-            try:
-                answer = MockTestAnswer.objects.get(session=session, question_id=question_id)
-            except MockTestAnswer.DoesNotExist:
-                continue
+        with transaction.atomic():
+            # Grade and finalize the session
+            total, correct_count = self.engine.submit(session, submitted_answers)
 
-            valid_choices = set(answer.question.options.values_list('id', flat=True))
-            if not set(choice_ids).issubset(valid_choices):
-                continue
-
-            answer.selected_choices.set(choice_ids)
-            correct_ids = set(answer.question.options.filter(is_correct=True).values_list('id', flat=True))
-            answer.is_correct = set(choice_ids) == correct_ids
-            answer.save()
-
-            if answer.is_correct:
-                correct_count += 1
-
-        # Finalize the session
-        session.score = round((correct_count / total) * 100)
-        session.finished_at = timezone.now()
-        session.save()
-
-        # Update evaluation
-        profile = request.user.profile
-        evaluation, _ = UserEvaluation.objects.get_or_create(user=profile)
-        wrong_count = total - correct_count
-        evaluation.QuestionAnswered = str(int(evaluation.QuestionAnswered or "0") + total)
-        evaluation.CorrectAnswered = str(int(evaluation.CorrectAnswered or "0") + correct_count)
-        evaluation.WrongAnswered = str(int(evaluation.WrongAnswered or "0") + wrong_count)
-        evaluation.save(update_fields=['QuestionAnswered', 'CorrectAnswered', 'WrongAnswered'])
+            # Update evaluation
+            wrong_count = total - correct_count
+            add_to_evaluation(
+                request.user, QuestionAnswered=total, CorrectAnswered=correct_count, WrongAnswered=wrong_count
+            )
 
         return Response({
             "success": True,
@@ -1991,41 +1984,21 @@ class MockTestViewSet(viewsets.ViewSet):
 
 class FreeMockTestViewSet(viewsets.ViewSet):
     permission_classes = [IsAuthenticated]
+    engine = free_mock_tests
 
     @action(detail=False, methods=['get', 'post'])
     def start(self, request):
         total_questions = 24
 
-        qs = (
-            Question.objects
-            .filter(type="freeMockTest")
-            .prefetch_related(
-                Prefetch("options", queryset=QuestionOption.objects.order_by("id")),
-                Prefetch("glossary", queryset=QuestionGlossary.objects.order_by("id")),
-            )
-        )
-        questions = list(qs)
-
-        if len(questions) < total_questions:
+        try:
+            session, paper = self.engine.start(request, total_questions)
+        except NotEnoughQuestions:
             return Response({
                 "success": False,
                 "message": "Not enough questions to start the test.",
                 "data": None
             }, status=status.HTTP_400_BAD_REQUEST)
 
-        selected_questions = random.sample(questions, total_questions)
-        session = FreeMockTestSession.objects.create(user=request.user, total_questions=total_questions)
-
-        # create answer rows
-        FreeMockTestAnswer.objects.bulk_create([
-            FreeMockTestAnswer(session=session, question=q) for q in selected_questions
-        ])
-
-        # serialize questions WITH correct answers (and pass request to render absolute image URLs)
-        serialized_questions = QuestionForTestSerializer(
-            selected_questions, many=True, context={"request": request}
-        ).data
-
         return Response({
             "success": True,
             "message": "Free mock test session started successfully.",
@@ -2034,27 +2007,19 @@ class FreeMockTestViewSet(viewsets.ViewSet):
                 "total_questions": total_questions,
                 "duration_minutes": session.duration_minutes,
                 "started_at": session.started_at,
-                "questions": serialized_questions
+                "questions": paper.questions
             }
         }, status=status.HTTP_200_OK)
     
 
 
     def retrieve(self, request, pk=None):
-        session = get_object_or_404(FreeMockTestSession, pk=pk, user=request.user)
+        session = self.engine.get_session(pk, request.user)
 
         # load questions + options in one go
-        answers = (
-            session.answers
-            .select_related("question")
-            .prefetch_related(
-                Prefetch("question__options", queryset=QuestionOption.objects.order_by("id")),
-                Prefetch("question__glossary", queryset=QuestionGlossary.objects.order_by("id")),
-            )
-        )
+        answers = self.engine.load_answers(session, selections=False)
 
-        questions = [a.question for a in answers]
-        questions_data = QuestionForTestSerializer(questions, many=True, context={"request": request}).data
+        questions_data = [question_for_test_data(a.question, request) for a in answers]
 
         return Response({
             "success": True,
@@ -2069,11 +2034,11 @@ class FreeMockTestViewSet(viewsets.ViewSet):
 
     @action(detail=True, methods=['post'])
     def answer(self, request, pk=None):
-        session = get_object_or_404(FreeMockTestSession, pk=pk, user=request.user)
         question_id = request.data.get('question_id')
         choice_ids = request.data.get('selected_options', [])
 
         if question_id is None or not isinstance(choice_ids, list):
+            self.engine.get_session(pk, request.user)
             return Response({
                 "success": False,
                 "message": 'Both "question_id" and "selected_options" are required.',
@@ -2081,43 +2046,26 @@ class FreeMockTestViewSet(viewsets.ViewSet):
             }, status=status.HTTP_400_BAD_REQUEST)
 
         try:
-            answer = FreeMockTestAnswer.objects.get(session=session, question_id=question_id)
-        except FreeMockTestAnswer.DoesNotExist:
-            return Response({
-                "success": False,
-                "message": 'Question not found in this session.',
-                "data": None
-            }, status=status.HTTP_400_BAD_REQUEST)
-
-        valid_choice_ids = set(answer.question.options.values_list('id', flat=True))
-        if not set(choice_ids).issubset(valid_choice_ids):
+            is_correct = self.engine.answer(pk, request.user, question_id, choice_ids)
+        except AnswerError as exc:
             return Response({
                 "success": False,
-                "message": 'One or more choices are invalid for this question.',
+                "message": str(exc),
                 "data": None
             }, status=status.HTTP_400_BAD_REQUEST)
 
-        answer.selected_choices.set(choice_ids)
-        correct_ids = set(answer.question.options.filter(is_correct=True).values_list('id', flat=True))
-        answer.is_correct = set(choice_ids) == correct_ids
-        answer.save()
-
         return Response({
             "success": True,
             "message": 'Answer submitted successfully.',
             "data": {
-                'correct': answer.is_correct
+                'correct': is_correct
             }
         })
 
     @action(detail=True, methods=['post'])
     def finish(self, request, pk=None):
-        session = get_object_or_404(FreeMockTestSession, pk=pk, user=request.user)
-        total = session.answers.count()
-        correct = session.answers.filter(is_correct=True).count()
-        session.score = round((correct / total) * 100)
-        session.finished_at = timezone.now()
-        session.save()
+        session = self.engine.get_session(pk, request.user)
+        self.engine.finish(session)
         return Response({
             "success": True,
             "message": "Free mock test session finished successfully.",
@@ -2126,7 +2074,21 @@ class FreeMockTestViewSet(viewsets.ViewSet):
 
     @action(detail=False, methods=['get'])
     def history(self, request):
-        sessions = FreeMockTestSession.objects.filter(user=request.user, finished_at__isnull=False).order_by('-finished_at')
+        sessions = self.engine.history(request.user)
+
+        if is_cursor_request(request):
+            paginator = HistoryCursorPagination()
+            page = paginator.paginate_queryset(sessions, request, view=self)
+            return Response({
+                "success": True,
+                "message": "Free mock test history retrieved successfully.",
+                "data": {
+                    "next": paginator.get_next_link(),
+                    "prev": paginator.get_previous_link(),
+                    "sessions": FreeMockTestResultSerializer(page, many=True).data
+                }
+            })
+
         return Response({
             "success": True,
             "message": "Free mock test history retrieved successfully.",
@@ -2135,7 +2097,7 @@ class FreeMockTestViewSet(viewsets.ViewSet):
 
     @action(detail=True, methods=['post'])
     def submit_all_answers(self, request, pk=None):
-        session = get_object_or_404(FreeMockTestSession, pk=pk, user=request.user)
+        session = self.engine.get_session(pk, request.user)
 
         answers_data = request.data.get('answers', [])
         if not isinstance(answers_data, list):
@@ -2145,40 +2107,9 @@ class FreeMockTestViewSet(viewsets.ViewSet):
                 "data": None
             }, status=status.HTTP_400_BAD_REQUEST)
 
-        total = 0
-        correct = 0
-
-        for item in answers_data:
-            question_id = item.get('question_id')
-            selected_ids = item.get('selected_options', [])
-
-            if question_id is None or not isinstance(selected_ids, list):
-                continue  # Skip invalid entries
-
-            try:
-                answer = FreeMockTestAnswer.objects.get(session=session, question_id=question_id)
-            except FreeMockTestAnswer.DoesNotExist:
-                continue
-
-            valid_choice_ids = set(answer.question.options.values_list('id', flat=True))
-            if not set(selected_ids).issubset(valid_choice_ids):
-                continue
-
-            answer.selected_choices.set(selected_ids)
-
-            correct_ids = set(answer.question.options.filter(is_correct=True).values_list('id', flat=True))
-            is_correct = set(selected_ids) == correct_ids
-            answer.is_correct = is_correct
-            answer.save()
-
-            total += 1
-            if is_correct:
-                correct += 1
-
-        # Finalize session
-        session.score = round((correct / total) * 100) if total else 0
-        session.finished_at = timezone.now()
-        session.save()
+        with transaction.atomic():
+            # Grade and finalize session
+            self.engine.submit(session, answers_data)
 
         return Response({
             "success": True,
@@ -2390,6 +2321,7 @@ class ImportLessonContentCSVView(APIView):
 
                 if glossaries:
                     Glossary.objects.bulk_create(glossaries)
+                    record_changes(Glossary, [g.id for g in glossaries], "insert")
                     created_counts["glossaries"] += len(glossaries)
 
         try:
@@ -0,0 +1,14 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from main.content_cache import bump_content_version
+from .models import GuideChapter, GuideLesson, GuideLessonContent, GuideGlossary
+
+
+@receiver([post_save, post_delete], sender=GuideChapter)
+@receiver([post_save, post_delete], sender=GuideLesson)
+@receiver([post_save, post_delete], sender=GuideLessonContent)
+@receiver([post_save, post_delete], sender=GuideGlossary)
+def guide_content_changed(sender, instance, **kwargs):
+    transaction.on_commit(bump_content_version)
@@ -1,3 +1,43 @@
 from django.test import TestCase
+from django.core.cache import cache
+from django.contrib.auth import get_user_model
+from rest_framework.test import APIClient
+
+from .models import GuideChapter, GuideLesson, GuideLessonContent, GuideLessonProgress
+
+User = get_user_model()
+
+
+class ChapterLessonDetailViewTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user(username="student", email="student@example.com", password="pass"))
+        chapter = GuideChapter.objects.create(name="Getting started")
+        self.lesson = GuideLesson.objects.create(name="1", title="Booking", chapter=chapter)
+        GuideLessonContent.objects.bulk_create([GuideLessonContent(lesson=self.lesson, description=f"Tip {i}") for i in range(15)])
+        self.url = f"/api/guide/chapters/{chapter.id}/{self.lesson.id}/"
+
+    def test_progress_is_recorded_in_bulk(self):
+        self.client.get(self.url, {"step": 0})
+        progress = GuideLessonProgress.objects.get()
+        self.assertAlmostEqual(progress.completion_percentage, 10 / 15 * 100)
+
+        response = self.client.get(self.url, {"step": 1})
+        self.assertAlmostEqual(response.data["data"]["completion_percentage"], 100.0)
+        self.assertEqual(progress.completed_contents.count(), 15)
+
+        # lesson, count, page, glossaries, progress row, completed ids;
+        # the revisit writes nothing
+        with self.assertNumQueries(6):
+            self.client.get(self.url, {"step": 1})
+
+    def test_revisit_follows_added_contents(self):
+        self.client.get(self.url, {"step": 0})
+        self.client.get(self.url, {"step": 1})
+        GuideLessonContent.objects.bulk_create([GuideLessonContent(lesson=self.lesson, description=f"New {i}") for i in range(5)])
+
+        response = self.client.get(self.url, {"step": 0})
+        self.assertAlmostEqual(response.data["data"]["completion_percentage"], 15 / 20 * 100)
+        self.assertAlmostEqual(GuideLessonProgress.objects.get().completion_percentage, 15 / 20 * 100)
 
-# Create your tests here.
@@ -10,6 +10,8 @@ from django.contrib.auth.models import AnonymousUser
 from .models import GuideChapter, GuideLesson, GuideLessonContent, GuideLessonProgress, GuideGlossary
 from .serializers import ChapterModelSerializer, LessonModelSerializers, LessonContentModelSerializer
 from django.db.models import Count, Q
+from main.conditional import conditional_content
+from main.progress import mark_contents_completed, progress_state
 from rest_framework import generics, permissions as permisons
 from rest_framework.permissions import IsAdminUser
 
@@ -19,10 +21,15 @@ from django.db import transaction
 
 
 
+def guide_progress_state(user):
+    return progress_state(GuideLessonProgress, user)
+
+
 # Create your views here.
 class ChapterListView(APIView):
     permission_classes = [AllowAny]  # Allow both authenticated and unauthenticated users
 
+    @conditional_content(user_state=guide_progress_state)
     def get(self, request):
         chapters = GuideChapter.objects.all().order_by('id')
         data = []
@@ -105,8 +112,9 @@ class ChapterLessonsView(APIView):
 class ChapterLessonDetailView(APIView):
     permission_classes = [AllowAny]
 
+    @conditional_content(skip_authenticated=True)
     def get(self, request, chapter_id, lesson_id):
-        lesson = get_object_or_404(GuideLesson, id=lesson_id, chapter_id=chapter_id)
+        lesson = get_object_or_404(GuideLesson.objects.select_related('chapter'), id=lesson_id, chapter_id=chapter_id)
 
         try:
             step = int(request.query_params.get('step', 0))
@@ -131,20 +139,17 @@ class ChapterLessonDetailView(APIView):
                 "data": None
             }, status=status.HTTP_404_NOT_FOUND)
 
-        current_page_items = lesson_qs[start_index:end_index]
+        current_page_items = list(lesson_qs[start_index:end_index].prefetch_related('glossaries'))
+        for content in current_page_items:
+            # chapter_name reads lesson.chapter; reuse the one instance
+            content.lesson = lesson
 
         completion_percentage = None  # Default for anonymous users
 
         if request.user.is_authenticated:
             user = request.user
             progress_obj, _ = GuideLessonProgress.objects.get_or_create(user=user, lesson=lesson)
-
-            for content in current_page_items:
-                if content not in progress_obj.completed_contents.all():
-                    progress_obj.completed_contents.add(content)
-
-            progress_obj.update_completion()
-            completion_percentage = progress_obj.completion_percentage
+            completion_percentage = mark_contents_completed(progress_obj, [content.id for content in current_page_items], total)
 
         serializer = LessonContentModelSerializer(current_page_items, many=True)
 
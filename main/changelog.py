@@ -0,0 +1,180 @@
+"""
+Change log of the study content for the delta-sync API (GET /sync/).
+
+Every insert, update and delete of a synced model is recorded as a
+ContentChange row (see main.signals). Each committed write takes the next
+version from the SyncCounter row, which stays locked until the log entry
+commits, so versions become visible in order and a client that synced up
+to N never misses an N that committed late.
+
+compact_changes() keeps the log bounded by dropping old entries and
+storing the cut-off as a SyncCheckpoint. Clients that last synced before
+the latest checkpoint get a full reset (every row) instead of a delta.
+"""
+import json
+
+from django.db import transaction
+from django.db.models import Max
+from rest_framework.utils.encoders import JSONEncoder
+
+from .models import (
+    Chapter, Lesson, LessonContent, Glossary, Question, QuestionOption,
+    GuidesSupport, GuideSupportContent, ContentChange, SyncCheckpoint, SyncCounter,
+)
+
+SYNC_MODELS = [
+    Chapter, Lesson, LessonContent, Glossary, Question, QuestionOption,
+    GuidesSupport, GuideSupportContent,
+]
+
+CHUNK_SIZE = 500
+
+
+def model_label(model):
+    return model._meta.model_name
+
+
+def sync_fields(model):
+    return [field.attname for field in model._meta.concrete_fields]
+
+
+def log_changes(label, ids, operation):
+    """
+    Writes the log entries for ``ids`` under the next version. The counter
+    row is locked until they commit, so a later version is never visible
+    before an earlier one.
+    """
+    with transaction.atomic():
+        counter, _ = SyncCounter.objects.select_for_update().get_or_create(pk=1)
+        counter.version += 1
+        counter.save(update_fields=['version'])
+        ContentChange.objects.bulk_create([
+            ContentChange(model=label, object_id=object_id, operation=operation, version=counter.version)
+            for object_id in ids
+        ])
+
+
+def record_change(instance, operation):
+    """
+    Logs the change once the surrounding transaction commits, so rolled
+    back writes never show up in a sync.
+    """
+    label, object_id = model_label(type(instance)), instance.pk
+    transaction.on_commit(lambda: log_changes(label, [object_id], operation))
+
+
+def record_changes(model, ids, operation):
+    """
+    Same as record_change() for rows written with bulk_create/update,
+    which send no signals.
+    """
+    label, ids = model_label(model), list(ids)
+    if ids:
+        transaction.on_commit(lambda: log_changes(label, ids, operation))
+
+
+def latest_version():
+    version = SyncCounter.objects.values_list('version', flat=True).first() or 0
+    return max(version, latest_checkpoint())
+
+
+def latest_checkpoint():
+    return SyncCheckpoint.objects.aggregate(version=Max('version'))['version'] or 0
+
+
+def needs_reset(since, version):
+    return since is None or since <= 0 or since > version or since < latest_checkpoint()
+
+
+def changed_ids(since, version):
+    """
+    {label: sorted ids of the objects changed in (since, version]}.
+    """
+    rows = (
+        ContentChange.objects
+        .filter(version__gt=since, version__lte=version)
+        .values_list('model', 'object_id')
+        .distinct()
+    )
+    ids = {}
+    for label, object_id in rows:
+        ids.setdefault(label, set()).add(object_id)
+    return {label: sorted(object_ids) for label, object_ids in ids.items()}
+
+
+def _dumps(value):
+    return json.dumps(value, cls=JSONEncoder, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def _model_stream(model, ids):
+    """
+    Yields the rows of one model as JSON arrays in sync_fields() order,
+    followed by the ids among ``ids`` that no longer exist. ids=None
+    streams the whole table.
+    """
+    fields = sync_fields(model)
+    yield b'{"fields":' + _dumps(fields) + b',"rows":['
+
+    found = set()
+    first = True
+    if ids is None:
+        rows = model.objects.order_by('pk').values_list(*fields).iterator(chunk_size=CHUNK_SIZE)
+        for row in rows:
+            yield (b'' if first else b',') + _dumps(row)
+            first = False
+    else:
+        for start in range(0, len(ids), CHUNK_SIZE):
+            chunk = ids[start:start + CHUNK_SIZE]
+            for row in model.objects.filter(pk__in=chunk).order_by('pk').values_list(*fields):
+                found.add(row[0])
+                yield (b'' if first else b',') + _dumps(row)
+                first = False
+
+    deleted = [object_id for object_id in ids if object_id not in found] if ids is not None else []
+    yield b'],"deleted":' + _dumps(deleted) + b'}'
+
+
+def iter_sync_stream(since):
+    """
+    Yields the JSON body of a sync response in chunks:
+
+        {"success":true,"message":...,"data":{"version":N,"reset":bool,
+         "models":{"<label>":{"fields":[...],"rows":[[...],...],"deleted":[ids]}}}}
+
+    Rows are read at their current state, so a row changed while streaming
+    may be sent ahead of its version; it is simply sent again next time.
+    """
+    version = latest_version()
+    reset = needs_reset(since, version)
+    ids = None if reset else changed_ids(since, version)
+
+    yield (
+        b'{"success":true,"message":"Content changes retrieved successfully.","data":{"version":'
+        + _dumps(version) + b',"reset":' + _dumps(reset) + b',"models":{'
+    )
+    first = True
+    for model in SYNC_MODELS:
+        label = model_label(model)
+        if ids is not None and label not in ids:
+            continue
+        yield (b'' if first else b',') + _dumps(label) + b':'
+        first = False
+        yield from _model_stream(model, None if ids is None else ids[label])
+    yield b'}}}'
+
+
+@transaction.atomic
+def compact_changes(before):
+    """
+    Drops the log entries created before ``before`` (a datetime) and stores
+    a checkpoint at the cut-off. Returns (checkpoint, removed) or (None, 0)
+    when there is nothing to compact.
+    """
+    cutoff = ContentChange.objects.filter(created__lt=before).aggregate(version=Max('version'))['version']
+    if cutoff is None or cutoff <= latest_checkpoint():
+        return None, 0
+
+    removed, _ = ContentChange.objects.filter(version__lte=cutoff).delete()
+    checkpoint = SyncCheckpoint.objects.create(version=cutoff)
+    SyncCheckpoint.objects.exclude(pk=checkpoint.pk).delete()
+    return checkpoint, removed
@@ -0,0 +1,67 @@
+"""
+Conditional GET (ETag / Last-Modified / 304) for the read-only content views.
+
+Validators come from the content version and its last change time in
+main.content_cache, so a 304 is decided before the view runs any query or
+serializer. Every body cache the decorated views read from is keyed by,
+or checked against, the same version, so a body is never older than the
+ETag it is sent with.
+"""
+import hashlib
+from functools import wraps
+
+from django.utils.cache import patch_vary_headers
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
+
+from .content_cache import get_content_version, get_content_last_modified
+
+
+def _is_authenticated(request):
+    return bool(request.user and request.user.is_authenticated)
+
+
+def conditional_content(user_state=None, skip_authenticated=False):
+    """
+    Decorates an APIView ``get`` method.
+
+    user_state: callable(user) returning a cheap fingerprint of the user's
+        data included in the response (e.g. progress). Authenticated responses
+        then get a per-user ETag and no Last-Modified.
+    skip_authenticated: no validators for authenticated users, for views whose
+        GET has side effects (progress recording).
+    """
+    def etag_func(request, *args, **kwargs):
+        if skip_authenticated and _is_authenticated(request):
+            return None
+
+        parts = [
+            str(get_content_version()),
+            request.build_absolute_uri(),
+            request.META.get("HTTP_ACCEPT", ""),
+        ]
+        if user_state is not None and _is_authenticated(request):
+            parts.append(f"{request.user.pk}:{user_state(request.user)}")
+        return hashlib.md5("|".join(parts).encode()).hexdigest()
+
+    def last_modified_func(request, *args, **kwargs):
+        if _is_authenticated(request) and (skip_authenticated or user_state is not None):
+            return None
+        return get_content_last_modified()
+
+    conditional = method_decorator(condition(etag_func=etag_func, last_modified_func=last_modified_func))
+    varies_by_user = user_state is not None or skip_authenticated
+
+    def decorator(func):
+        view = conditional(func)
+
+        @wraps(func)
+        def inner(self, request, *args, **kwargs):
+            response = view(self, request, *args, **kwargs)
+            if varies_by_user:
+                patch_vary_headers(response, ("Authorization",))
+            return response
+
+        return inner
+
+    return decorator
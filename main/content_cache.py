@@ -0,0 +1,125 @@
+"""
+Versioned cache for the study content (syllabus, guides and home page).
+
+Every cached entry is keyed by a global content version number. Signals in
+main.signals bump the version whenever the content is edited, so old
+entries are simply never read again and expire on their own.
+
+The version lives in the ContentVersion row, so an edit made by any worker,
+management command or shell is seen by every process. Each process (or
+every process, with a shared cache backend) holds it in the default cache
+for CONTENT_VERSION_TTL seconds, so another worker's edit shows up within
+that time. The same goes for every in-process cache keyed by, or checked
+against, this version (answer keys, the question index, the paper pool,
+the hot cache, lesson snapshots). Works with the local-memory cache as well
+as any shared backend (Redis, Memcached, ...).
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F, Value, BigIntegerField
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .models import ContentVersion
+
+
+CONTENT_VERSION_KEY = "content:version"
+
+# Per-process hit/miss counters, exposed through content_cache_stats().
+_stats = {"hits": 0, "misses": 0}
+
+
+def _cache_timeout():
+    return getattr(settings, "CONTENT_CACHE_TIMEOUT", 60 * 60)
+
+
+def _version_ttl():
+    return getattr(settings, "CONTENT_VERSION_TTL", 5)
+
+
+def _clock_version():
+    # Versions never fall below the clock, so a database restored from a
+    # backup never goes back to a number that older entries were stored under.
+    return int(time.time() * 1000)
+
+
+def _read_version():
+    """
+    Reads (version, modified) from the database and holds it for
+    CONTENT_VERSION_TTL seconds.
+    """
+    state = ContentVersion.objects.filter(pk=1).values_list('version', 'modified').first()
+    if state is None:
+        row, _ = ContentVersion.objects.get_or_create(
+            pk=1, defaults={'version': _clock_version(), 'modified': timezone.now()},
+        )
+        state = (row.version, row.modified)
+    cache.set(CONTENT_VERSION_KEY, state, timeout=_version_ttl())
+    return state
+
+
+def _current_version():
+    state = cache.get(CONTENT_VERSION_KEY)
+    return state if state is not None else _read_version()
+
+
+def get_content_version():
+    return _current_version()[0]
+
+
+def bump_content_version():
+    updated = ContentVersion.objects.filter(pk=1).update(
+        version=Greatest(F('version') + 1, Value(_clock_version(), output_field=BigIntegerField())),
+        modified=timezone.now(),
+    )
+    if not updated:
+        _read_version()
+        return bump_content_version()
+    return _read_version()[0]
+
+
+def get_content_last_modified():
+    """
+    Time of the last content change.
+    """
+    return _current_version()[1]
+
+
+def content_cache_key(name, *parts):
+    return ":".join(["content", f"v{get_content_version()}", name, *(str(p) for p in parts)])
+
+
+def get_or_build(name, builder, *parts):
+    """
+    Returns the cached value for (name, *parts) at the current content
+    version, calling builder() on a miss. None results are not cached.
+    """
+    key = content_cache_key(name, *parts)
+    value = cache.get(key)
+    if value is not None:
+        _stats["hits"] += 1
+        return value
+
+    _stats["misses"] += 1
+    value = builder()
+    if value is not None:
+        cache.set(key, value, timeout=_cache_timeout())
+    return value
+
+
+def content_cache_stats():
+    hits, misses = _stats["hits"], _stats["misses"]
+    total = hits + misses
+    return {
+        "version": get_content_version(),
+        "hits": hits,
+        "misses": misses,
+        "hit_ratio": round(hits / total, 4) if total else 0.0,
+    }
+
+
+def reset_content_cache_stats():
+    _stats["hits"] = 0
+    _stats["misses"] = 0
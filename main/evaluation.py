@@ -0,0 +1,63 @@
+"""
+In-place updates of UserEvaluation counters.
+
+Counters are incremented with F() expressions in a single UPDATE, so two
+tests finishing at the same time both count. The practice totals (sum of
+completion percentages and number of chapters with practice questions) are
+recounted from the user's ChapterProgress rows whenever those change; see
+main.progress.refresh_chapter_progress and main.signals.
+"""
+from django.db.models import Count, F, FloatField, IntegerField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+from .models import UserEvaluation, ChapterProgress
+
+
+def add_to_evaluation(user, **increments):
+    """
+    Adds the increments ({counter field: amount}) to the evaluation of the
+    user's profile, creating the evaluation if it is missing.
+    """
+    values = {field: F(field) + amount for field, amount in increments.items()}
+    if UserEvaluation.objects.filter(user__user=user).update(**values):
+        return
+    evaluation, created = UserEvaluation.objects.get_or_create(user=user.profile, defaults=increments)
+    if not created:
+        UserEvaluation.objects.filter(pk=evaluation.pk).update(**values)
+
+
+def practice_totals():
+    """
+    Expressions of the expected practice totals of UserEvaluation rows.
+    Chapters without practice questions (total_count 0) are left out.
+    """
+    rows = (
+        ChapterProgress.objects
+        .filter(user__profile=OuterRef('user_id'), total_count__gt=0)
+        .order_by()
+        .values('user_id')
+    )
+    return {
+        'practice_percentage_sum': Coalesce(
+            Subquery(rows.annotate(total=Sum('completion_percentage')).values('total'), output_field=FloatField()),
+            Value(0.0),
+        ),
+        'practice_chapter_count': Coalesce(
+            Subquery(rows.annotate(count=Count('*')).values('count'), output_field=IntegerField()),
+            0,
+        ),
+    }
+
+
+def refresh_practice_totals(user_ids):
+    """
+    Recounts the practice totals of the given users (ids or a values
+    queryset of ids) in one UPDATE.
+    """
+    return UserEvaluation.objects.filter(user__user_id__in=user_ids).update(**practice_totals())
+
+
+def overall_practice_completion(evaluation):
+    if not evaluation.practice_chapter_count:
+        return 0.0
+    return round(evaluation.practice_percentage_sum / evaluation.practice_chapter_count, 2)
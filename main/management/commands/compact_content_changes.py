@@ -0,0 +1,22 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from main.changelog import compact_changes
+
+
+class Command(BaseCommand):
+    help = "Compact the content change log into a sync checkpoint. Run it periodically (e.g. daily from cron)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--keep-days", type=int, default=30, help="Keep the changes of the last N days (default 30).")
+
+    def handle(self, *args, **options):
+        before = timezone.now() - timedelta(days=options["keep_days"])
+        checkpoint, removed = compact_changes(before)
+
+        if checkpoint is None:
+            self.stdout.write("Nothing to compact.")
+            return
+        self.stdout.write(self.style.SUCCESS(f"Checkpoint at version {checkpoint.version}, {removed} log entries removed."))
@@ -0,0 +1,54 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import F
+
+from main.models import LessonProgress, ChapterProgress, UserEvaluation
+from main.progress import lesson_counts, chapter_counts, refresh_counters
+from main.evaluation import practice_totals
+
+
+class Command(BaseCommand):
+    help = "Rebuild the completed/total counters of lesson and chapter progress and the practice totals of user evaluations, e.g. after a bulk import."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--check", action="store_true", help="Only report rows whose counters are wrong; exit with an error if any.")
+
+    def handle(self, *args, **options):
+        tables = [
+            ("Lesson progress", LessonProgress, lesson_counts()),
+            ("Chapter progress", ChapterProgress, chapter_counts()),
+        ]
+
+        wrong_total = 0
+        for label, model, counts in tables:
+            wrong = (
+                model.objects
+                .annotate(expected_completed=counts['completed_count'], expected_total=counts['total_count'])
+                .exclude(completed_count=F('expected_completed'), total_count=F('expected_total'))
+                .count()
+            )
+            wrong_total += wrong
+
+            if options["check"]:
+                self.stdout.write(f"{label}: {wrong} rows out of date")
+            else:
+                updated = refresh_counters(model.objects.all(), counts)
+                self.stdout.write(f"{label}: {updated} rows rebuilt, {wrong} were out of date")
+
+        # Practice totals sum the chapter percentages, so they go after the chapters
+        totals = practice_totals()
+        wrong = (
+            UserEvaluation.objects
+            .annotate(expected_sum=totals['practice_percentage_sum'], expected_count=totals['practice_chapter_count'])
+            .exclude(practice_percentage_sum=F('expected_sum'), practice_chapter_count=F('expected_count'))
+            .count()
+        )
+        wrong_total += wrong
+        if options["check"]:
+            self.stdout.write(f"Practice totals: {wrong} evaluations out of date")
+        else:
+            updated = UserEvaluation.objects.update(**totals)
+            self.stdout.write(f"Practice totals: {updated} evaluations rebuilt, {wrong} were out of date")
+
+        if options["check"] and wrong_total:
+            raise CommandError(f"{wrong_total} progress rows or evaluations have out-of-date counters; run without --check to rebuild.")
+        self.stdout.write(self.style.SUCCESS("Progress counters are up to date."))
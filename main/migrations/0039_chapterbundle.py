@@ -0,0 +1,26 @@
+# Generated by Django 5.2.1 on 2026-10-18 10:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0038_rename_definition_questionglossary_description'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChapterBundle',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('digest', models.CharField(blank=True, max_length=64)),
+                ('file', models.FileField(blank=True, upload_to='bundles/')),
+                ('size', models.PositiveIntegerField(default=0)),
+                ('is_stale', models.BooleanField(default=True)),
+                ('built_at', models.DateTimeField(auto_now=True)),
+                ('chapter', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='bundle', to='main.chapter')),
+            ],
+        ),
+    ]
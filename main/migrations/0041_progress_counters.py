@@ -0,0 +1,79 @@
+# Generated by Django 5.2.1 on 2026-10-18 10:48
+
+from django.db import migrations, models
+
+from django.db.models import Case, Count, F, FloatField, IntegerField, OuterRef, Subquery, Value, When
+from django.db.models.functions import Cast, Coalesce
+
+
+def _count(queryset, group_by):
+    counts = queryset.order_by().values(group_by).annotate(count=Count('*')).values('count')
+    return Coalesce(Subquery(counts, output_field=IntegerField()), 0)
+
+
+def _fill(queryset, completed, total):
+    queryset.update(completed_count=completed, total_count=total)
+    queryset.update(completion_percentage=Case(
+        When(total_count=0, then=Value(0.0)),
+        default=Cast('completed_count', FloatField()) * 100 / F('total_count'),
+        output_field=FloatField(),
+    ))
+
+
+def backfill_counters(apps, schema_editor):
+    LessonProgress = apps.get_model('main', 'LessonProgress')
+    LessonContent = apps.get_model('main', 'LessonContent')
+    ChapterProgress = apps.get_model('main', 'ChapterProgress')
+    Question = apps.get_model('main', 'Question')
+
+    _fill(
+        LessonProgress.objects.all(),
+        _count(
+            LessonProgress.completed_contents.through.objects.filter(
+                lessonprogress_id=OuterRef('pk'), lessoncontent__lesson_id=OuterRef('lesson_id'),
+            ),
+            'lessonprogress_id',
+        ),
+        _count(LessonContent.objects.filter(lesson_id=OuterRef('lesson_id')), 'lesson_id'),
+    )
+    _fill(
+        ChapterProgress.objects.all(),
+        _count(
+            ChapterProgress.completed_questions.through.objects.filter(
+                chapterprogress_id=OuterRef('pk'), question__type="practice", question__chapter_id=OuterRef('chapter_id'),
+            ),
+            'chapterprogress_id',
+        ),
+        _count(Question.objects.filter(chapter_id=OuterRef('chapter_id'), type="practice"), 'chapter_id'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0040_contentchange_synccheckpoint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chapterprogress',
+            name='completed_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='chapterprogress',
+            name='total_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='lessonprogress',
+            name='completed_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='lessonprogress',
+            name='total_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
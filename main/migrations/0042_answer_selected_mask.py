@@ -0,0 +1,68 @@
+# Generated by Django 5.2.1 on 2026-10-18 10:54
+
+from django.db import migrations, models
+
+BATCH_SIZE = 1000
+
+
+def _flush(answer_model, masks):
+    answer_model.objects.bulk_update(
+        [answer_model(pk=pk, selected_mask=mask) for pk, mask in masks.items()], ['selected_mask']
+    )
+
+
+def _backfill(answer_model, option_model):
+    # Position of each option within its question, in id order
+    positions = {}
+    seen = {}
+    for option_id, question_id in option_model.objects.order_by('question_id', 'id').values_list('id', 'question_id'):
+        positions[option_id] = seen.get(question_id, 0)
+        seen[question_id] = positions[option_id] + 1
+
+    field = answer_model._meta.get_field('selected_choices')
+    source = f"{field.m2m_field_name()}_id"
+    target = f"{field.m2m_reverse_field_name()}_id"
+    rows = (
+        field.remote_field.through.objects
+        .order_by(source)
+        .values_list(source, target)
+        .iterator(chunk_size=BATCH_SIZE)
+    )
+
+    masks = {}
+    current = None
+    for answer_id, option_id in rows:
+        if answer_id != current and len(masks) >= BATCH_SIZE:
+            _flush(answer_model, masks)
+            masks = {}
+        current = answer_id
+        masks[answer_id] = masks.get(answer_id, 0) | (1 << positions[option_id])
+    if masks:
+        _flush(answer_model, masks)
+
+
+def backfill_selected_masks(apps, schema_editor):
+    QuestionOption = apps.get_model('main', 'QuestionOption')
+    _backfill(apps.get_model('main', 'MockTestAnswer'), QuestionOption)
+    _backfill(apps.get_model('main', 'FreeMockTestAnswer'), QuestionOption)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0041_progress_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='freemocktestanswer',
+            name='selected_mask',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='mocktestanswer',
+            name='selected_mask',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_selected_masks, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,100 @@
+from django.db import migrations, models
+
+COUNTERS = ['QuestionAnswered', 'CorrectAnswered', 'WrongAnswered']
+
+
+def parse(value):
+    try:
+        return max(int(str(value).strip() or 0), 0)
+    except ValueError:
+        return 0
+
+
+def copy_counters(apps, schema_editor):
+    UserEvaluation = apps.get_model('main', 'UserEvaluation')
+    batch = []
+    for evaluation in UserEvaluation.objects.only('id', *COUNTERS).iterator(chunk_size=2000):
+        for field in COUNTERS:
+            setattr(evaluation, f'{field}Count', parse(getattr(evaluation, field)))
+        batch.append(evaluation)
+        if len(batch) >= 2000:
+            UserEvaluation.objects.bulk_update(batch, [f'{field}Count' for field in COUNTERS])
+            batch = []
+    if batch:
+        UserEvaluation.objects.bulk_update(batch, [f'{field}Count' for field in COUNTERS])
+
+
+def copy_counters_back(apps, schema_editor):
+    UserEvaluation = apps.get_model('main', 'UserEvaluation')
+    batch = []
+    for evaluation in UserEvaluation.objects.only('id', *[f'{field}Count' for field in COUNTERS]).iterator(chunk_size=2000):
+        for field in COUNTERS:
+            setattr(evaluation, field, str(getattr(evaluation, f'{field}Count')))
+        batch.append(evaluation)
+        if len(batch) >= 2000:
+            UserEvaluation.objects.bulk_update(batch, COUNTERS)
+            batch = []
+    if batch:
+        UserEvaluation.objects.bulk_update(batch, COUNTERS)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0042_answer_selected_mask'),
+    ]
+
+    operations = [
+        # A default lets the old columns be re-added when migrating back
+        *[
+            migrations.AlterField(
+                model_name='userevaluation',
+                name=field,
+                field=models.CharField(max_length=100, default='0'),
+            )
+            for field in COUNTERS
+        ],
+        migrations.AddField(
+            model_name='userevaluation',
+            name='QuestionAnsweredCount',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='userevaluation',
+            name='CorrectAnsweredCount',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='userevaluation',
+            name='WrongAnsweredCount',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(copy_counters, copy_counters_back),
+        migrations.RemoveField(
+            model_name='userevaluation',
+            name='QuestionAnswered',
+        ),
+        migrations.RemoveField(
+            model_name='userevaluation',
+            name='CorrectAnswered',
+        ),
+        migrations.RemoveField(
+            model_name='userevaluation',
+            name='WrongAnswered',
+        ),
+        migrations.RenameField(
+            model_name='userevaluation',
+            old_name='QuestionAnsweredCount',
+            new_name='QuestionAnswered',
+        ),
+        migrations.RenameField(
+            model_name='userevaluation',
+            old_name='CorrectAnsweredCount',
+            new_name='CorrectAnswered',
+        ),
+        migrations.RenameField(
+            model_name='userevaluation',
+            old_name='WrongAnsweredCount',
+            new_name='WrongAnswered',
+        ),
+    ]
@@ -0,0 +1,59 @@
+from django.db import migrations, models
+
+from django.db.models import Case, Count, F, FloatField, IntegerField, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Cast, Coalesce
+
+
+def backfill_practice_totals(apps, schema_editor):
+    UserEvaluation = apps.get_model('main', 'UserEvaluation')
+    ChapterProgress = apps.get_model('main', 'ChapterProgress')
+    Question = apps.get_model('main', 'Question')
+
+    # Rows created without an M2M change never had their total counted
+    totals = Question.objects.filter(chapter_id=OuterRef('chapter_id'), type="practice").order_by().values('chapter_id')
+    ChapterProgress.objects.update(total_count=Coalesce(
+        Subquery(totals.annotate(count=Count('*')).values('count'), output_field=IntegerField()), 0,
+    ))
+    ChapterProgress.objects.update(completion_percentage=Case(
+        When(total_count=0, then=Value(0.0)),
+        default=Cast('completed_count', FloatField()) * 100 / F('total_count'),
+        output_field=FloatField(),
+    ))
+
+    rows = (
+        ChapterProgress.objects
+        .filter(user__profile=OuterRef('user_id'), total_count__gt=0)
+        .order_by()
+        .values('user_id')
+    )
+    UserEvaluation.objects.update(
+        practice_percentage_sum=Coalesce(
+            Subquery(rows.annotate(total=Sum('completion_percentage')).values('total'), output_field=FloatField()),
+            Value(0.0),
+        ),
+        practice_chapter_count=Coalesce(
+            Subquery(rows.annotate(count=Count('*')).values('count'), output_field=IntegerField()),
+            0,
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0043_evaluation_integer_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userevaluation',
+            name='practice_percentage_sum',
+            field=models.FloatField(default=0.0),
+        ),
+        migrations.AddField(
+            model_name='userevaluation',
+            name='practice_chapter_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_practice_totals, migrations.RunPython.noop),
+    ]
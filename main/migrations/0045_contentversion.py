@@ -0,0 +1,30 @@
+import time
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def create_version_row(apps, schema_editor):
+    ContentVersion = apps.get_model('main', 'ContentVersion')
+    ContentVersion.objects.get_or_create(
+        pk=1, defaults={'version': int(time.time() * 1000), 'modified': timezone.now()},
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0044_evaluation_practice_totals'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ContentVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.BigIntegerField()),
+                ('modified', models.DateTimeField()),
+            ],
+        ),
+        migrations.RunPython(create_version_row, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,40 @@
+from django.db import migrations, models
+from django.db.models import F, Max
+
+
+def number_existing_changes(apps, schema_editor):
+    ContentChange = apps.get_model('main', 'ContentChange')
+    SyncCheckpoint = apps.get_model('main', 'SyncCheckpoint')
+    SyncCounter = apps.get_model('main', 'SyncCounter')
+
+    # Existing clients synced from the change ids, so keep them as versions
+    ContentChange.objects.update(version=F('id'))
+    version = max(
+        ContentChange.objects.aggregate(version=Max('id'))['version'] or 0,
+        SyncCheckpoint.objects.aggregate(version=Max('version'))['version'] or 0,
+    )
+    SyncCounter.objects.get_or_create(pk=1, defaults={'version': version})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0045_contentversion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SyncCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='contentchange',
+            name='version',
+            field=models.BigIntegerField(db_index=True, default=0),
+            preserve_default=False,
+        ),
+        migrations.RunPython(number_existing_changes, migrations.RunPython.noop),
+    ]
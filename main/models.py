@@ -50,9 +50,14 @@ class UserEvaluation(models.Model):
     MockTestTaken = models.PositiveIntegerField(default=0)
     LeftMockTest = models.CharField(max_length=20, choices=LeftMockTest, default='Limited')
     PracticeCompleted = models.CharField(max_length=100)
-    QuestionAnswered = models.CharField(max_length=100)
-    CorrectAnswered = models.CharField(max_length=100)
-    WrongAnswered = models.CharField(max_length=100)
+    # Mock test answer counters, incremented in place (see main/evaluation.py)
+    QuestionAnswered = models.PositiveIntegerField(default=0)
+    CorrectAnswered = models.PositiveIntegerField(default=0)
+    WrongAnswered = models.PositiveIntegerField(default=0)
+    # Practice completion over the chapters that have practice questions,
+    # kept current from ChapterProgress (see main/evaluation.py)
+    practice_percentage_sum = models.FloatField(default=0.0)
+    practice_chapter_count = models.PositiveIntegerField(default=0)
 
     def __str__(self):
         return f"Evaluation of {self.user.full_name}"
@@ -124,6 +129,9 @@ class LessonProgress(models.Model):
     lesson = models.ForeignKey(Lesson, on_delete=models.CASCADE, related_name='progress')
     completed_contents = models.ManyToManyField(LessonContent, blank=True)
     completion_percentage = models.FloatField(default=0.0)
+    # Kept current by main.signals (see main/progress.py)
+    completed_count = models.PositiveIntegerField(default=0)
+    total_count = models.PositiveIntegerField(default=0)
 
     class Meta:
         unique_together = ('user', 'lesson')
@@ -132,10 +140,8 @@ class LessonProgress(models.Model):
         return f"{self.user.username} - {self.lesson.name} ({self.completion_percentage}%)"
 
     def update_completion(self):
-        total = self.lesson.lessoncontent_set.count()
-        completed = self.completed_contents.count()
-        self.completion_percentage = (completed / total * 100) if total else 0.0
-        self.save()
+        # The counters and percentage are updated on every change; just reload them
+        self.refresh_from_db(fields=['completed_count', 'total_count', 'completion_percentage'])
     
 
 
@@ -221,6 +227,9 @@ class ChapterProgress(models.Model):
     chapter = models.ForeignKey(Chapter, on_delete=models.CASCADE, related_name='progress')
     completed_questions = models.ManyToManyField(Question, blank=True)
     completion_percentage = models.FloatField(default=0.0)
+    # Practice questions only; kept current by main.signals (see main/progress.py)
+    completed_count = models.PositiveIntegerField(default=0)
+    total_count = models.PositiveIntegerField(default=0)
 
     class Meta:
         unique_together = ('user', 'chapter')  # One progress entry per user per chapter
@@ -229,10 +238,8 @@ class ChapterProgress(models.Model):
         return f"{self.user.username} - {self.chapter.name} ({self.completion_percentage}%)"
 
     def update_completion(self):
-        total_questions = self.chapter.questions.filter(type="practice").count()
-        completed = self.completed_questions.filter(type="practice").count()
-        self.completion_percentage = (completed / total_questions * 100) if total_questions else 0.0
-        self.save()
+        # The counters and percentage are updated on every change; just reload them
+        self.refresh_from_db(fields=['completed_count', 'total_count', 'completion_percentage'])
 
 
 class MockTestSession(models.Model):
@@ -250,6 +257,8 @@ class MockTestAnswer(models.Model):
     session = models.ForeignKey(MockTestSession, related_name='answers', on_delete=models.CASCADE)
     question = models.ForeignKey(Question, on_delete=models.CASCADE)
     selected_choices = models.ManyToManyField(QuestionOption)
+    # Bit n = n-th option of the question in id order (see api/grading.py)
+    selected_mask = models.BigIntegerField(default=0)
     is_correct = models.BooleanField(default=False)
     
     
@@ -268,4 +277,85 @@ class FreeMockTestAnswer(models.Model):
     session = models.ForeignKey(FreeMockTestSession, related_name='answers', on_delete=models.CASCADE)
     question = models.ForeignKey(Question, on_delete=models.CASCADE)
     selected_choices = models.ManyToManyField(QuestionOption)
+    # Bit n = n-th option of the question in id order (see api/grading.py)
+    selected_mask = models.BigIntegerField(default=0)
     is_correct = models.BooleanField(default=False)
+
+
+class ChapterBundle(models.Model):
+    """
+    Compressed offline study bundle of a chapter (see api/bundles.py).
+    The file name carries the sha256 digest of the bundle contents.
+    """
+    chapter = models.OneToOneField(Chapter, on_delete=models.CASCADE, related_name='bundle')
+    digest = models.CharField(max_length=64, blank=True)
+    file = models.FileField(upload_to='bundles/', blank=True)
+    size = models.PositiveIntegerField(default=0)
+    is_stale = models.BooleanField(default=True)
+    built_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.chapter.name} bundle ({self.digest[:12]})"
+
+
+class ContentVersion(models.Model):
+    """
+    Single row holding the global content version and the time of the last
+    content change, so every process agrees on them (see
+    main/content_cache.py).
+    """
+    version = models.BigIntegerField()
+    modified = models.DateTimeField()
+
+    def __str__(self):
+        return f"Content v{self.version}"
+
+
+ChangeOperation = {
+    "insert": "insert",
+    "update": "update",
+    "delete": "delete",
+}
+
+
+class ContentChange(models.Model):
+    """
+    Change log of the study content used by the delta-sync API. ``version``
+    is the content version a client syncs from, taken from SyncCounter in
+    commit order (see main/changelog.py).
+    """
+    model = models.CharField(max_length=50)
+    object_id = models.BigIntegerField()
+    operation = models.CharField(choices=ChangeOperation, max_length=6)
+    version = models.BigIntegerField(db_index=True)
+    created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['model', 'object_id'])]
+
+    def __str__(self):
+        return f"v{self.version} {self.operation} {self.model} #{self.object_id}"
+
+
+class SyncCounter(models.Model):
+    """
+    Single row holding the last content version handed to the change log.
+    It is locked while a change is logged, so versions are assigned in the
+    order the changes commit.
+    """
+    version = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"Sync v{self.version}"
+
+
+class SyncCheckpoint(models.Model):
+    """
+    Changes up to and including ``version`` were compacted; clients that
+    last synced before it need a full resync.
+    """
+    version = models.BigIntegerField()
+    created = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Checkpoint v{self.version}"
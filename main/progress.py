@@ -0,0 +1,205 @@
+"""
+Lesson and chapter progress helpers.
+
+LessonProgress and ChapterProgress store completed_count / total_count next
+to completion_percentage, so reading a percentage never recounts the M2M.
+The refresh_* functions recount them in a single UPDATE per table (and
+chapter refreshes also recount the users' practice totals on
+UserEvaluation); the signals in main.signals call them on every M2M change,
+and through refresh_on_commit() whenever lesson contents or practice
+questions are added, removed or moved.
+"""
+import threading
+
+from django.db import transaction
+from django.db.models import Case, Count, F, FloatField, IntegerField, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Cast, Coalesce, Least
+
+from .models import LessonProgress, LessonContent, ChapterProgress, Question
+from .evaluation import refresh_practice_totals
+
+
+def progress_state(model, user):
+    """
+    Cheap fingerprint of the user's rows of a lesson progress model
+    (LessonProgress or GuideLessonProgress), used in the ETags of views
+    that include completion percentages.
+    """
+    state = model.objects.filter(user=user).aggregate(count=Count('id'), total=Sum('completion_percentage'))
+    return f"{state['count']}:{state['total'] or 0}"
+
+
+def _count(queryset, group_by):
+    counts = queryset.order_by().values(group_by).annotate(count=Count('*')).values('count')
+    return Coalesce(Subquery(counts, output_field=IntegerField()), 0)
+
+
+def _percentage():
+    return Case(
+        When(total_count=0, then=Value(0.0)),
+        default=Cast('completed_count', FloatField()) * 100 / F('total_count'),
+        output_field=FloatField(),
+    )
+
+
+def lesson_counts():
+    """
+    Expressions of the expected counters of LessonProgress rows.
+    """
+    through = LessonProgress.completed_contents.through
+    return {
+        'completed_count': _count(
+            through.objects.filter(lessonprogress_id=OuterRef('pk'), lessoncontent__lesson_id=OuterRef('lesson_id')),
+            'lessonprogress_id',
+        ),
+        'total_count': _count(LessonContent.objects.filter(lesson_id=OuterRef('lesson_id')), 'lesson_id'),
+    }
+
+
+def chapter_counts():
+    """
+    Expressions of the expected counters of ChapterProgress rows
+    (practice questions only).
+    """
+    through = ChapterProgress.completed_questions.through
+    return {
+        'completed_count': _count(
+            through.objects.filter(
+                chapterprogress_id=OuterRef('pk'), question__type="practice", question__chapter_id=OuterRef('chapter_id'),
+            ),
+            'chapterprogress_id',
+        ),
+        'total_count': _count(Question.objects.filter(chapter_id=OuterRef('chapter_id'), type="practice"), 'chapter_id'),
+    }
+
+
+def refresh_counters(queryset, counts):
+    """
+    Recounts the counters of the progress rows in queryset and recomputes
+    their percentage. Returns the number of rows updated.
+    """
+    updated = queryset.update(**counts)
+    if updated:
+        queryset.update(completion_percentage=_percentage())
+    return updated
+
+
+def refresh_lesson_progress(queryset):
+    return refresh_counters(queryset, lesson_counts())
+
+
+def refresh_chapter_progress(queryset):
+    updated = refresh_counters(queryset, chapter_counts())
+    if updated:
+        refresh_practice_totals(queryset.values('user_id'))
+    return updated
+
+
+_pending = threading.local()
+
+
+def _run_pending_refreshes():
+    lesson_ids, chapter_ids = getattr(_pending, 'lessons', set()), getattr(_pending, 'chapters', set())
+    _pending.lessons, _pending.chapters = set(), set()
+    if lesson_ids:
+        refresh_lesson_progress(LessonProgress.objects.filter(lesson_id__in=lesson_ids))
+    if chapter_ids:
+        refresh_chapter_progress(ChapterProgress.objects.filter(chapter_id__in=chapter_ids))
+
+
+def refresh_on_commit(lesson_ids=(), chapter_ids=()):
+    """
+    Queues a recount of the progress rows of the lessons and chapters for
+    when the current transaction commits. Everything queued in the
+    transaction is recounted together by the first callback to run, with
+    one refresh per table, so an import of many rows recounts each lesson
+    or chapter once. Queued ids left by a rolled back transaction are
+    recounted with the next one.
+    """
+    if not hasattr(_pending, 'lessons'):
+        _pending.lessons, _pending.chapters = set(), set()
+    _pending.lessons.update(lesson_id for lesson_id in lesson_ids if lesson_id is not None)
+    _pending.chapters.update(chapter_id for chapter_id in chapter_ids if chapter_id is not None)
+    transaction.on_commit(_run_pending_refreshes)
+
+
+def mark_contents_completed(progress, content_ids, total):
+    """
+    Records the contents as completed on a LessonProgress or
+    GuideLessonProgress and updates its completion percentage. ``total`` is
+    the number of contents of the lesson.
+
+    One read of the already completed ids. If something is new, one
+    idempotent bulk insert into the through table, then one UPDATE that
+    recounts the through table, so concurrent page loads of the lesson that
+    each insert their own share still end at the full count, and a reload
+    of the result. Otherwise the stored values are only rewritten when they
+    no longer match the completed ids read and ``total`` (contents added or
+    removed since, or an older miscount). Both only count the contents that
+    still belong to the lesson, like refresh_lesson_progress().
+    """
+    manager = progress.completed_contents
+    through = manager.through
+    source = f"{manager.source_field_name}_id"
+    target = f"{manager.target_field_name}_id"
+    # LessonProgress keeps denormalized counters, GuideLessonProgress does not
+    has_counters = hasattr(progress, 'completed_count')
+    in_lesson = f"{manager.target_field_name}__lesson_id"
+
+    completed = set(
+        through.objects.filter(**{source: progress.pk, in_lesson: progress.lesson_id}).values_list(target, flat=True)
+    )
+    new_ids = [content_id for content_id in dict.fromkeys(content_ids) if content_id not in completed]
+
+    if new_ids:
+        through.objects.bulk_create(
+            [through(**{source: progress.pk, target: content_id}) for content_id in new_ids],
+            ignore_conflicts=True,
+        )
+        done = Least(
+            _count(through.objects.filter(**{source: OuterRef('pk'), in_lesson: OuterRef('lesson_id')}), source),
+            Value(total),
+        )
+        updates = {
+            'completion_percentage': Cast(done, FloatField()) * 100 / Value(total) if total else Value(0.0),
+        }
+        if has_counters:
+            updates.update(completed_count=done, total_count=Value(total))
+        type(progress).objects.filter(pk=progress.pk).update(**updates)
+        progress.refresh_from_db(fields=list(updates))
+        return progress.completion_percentage
+
+    done = min(len(completed), total)
+    percentage = (done / total * 100) if total else 0.0
+    update_fields = []
+    if progress.completion_percentage != percentage:
+        progress.completion_percentage = percentage
+        update_fields.append('completion_percentage')
+    if has_counters and (progress.completed_count, progress.total_count) != (done, total):
+        progress.completed_count, progress.total_count = done, total
+        update_fields += ['completed_count', 'total_count']
+    if update_fields:
+        progress.save(update_fields=update_fields)
+    return progress.completion_percentage
+
+
+def mark_questions_completed(progress, question_ids):
+    """
+    Records the questions as completed on a ChapterProgress: one read of
+    the already completed ids, then (only if something is new) one bulk
+    insert into the through table and the counter refresh, which
+    bulk_create does not trigger through m2m_changed. Call
+    progress.update_completion() afterwards to reload the counters.
+    """
+    through = ChapterProgress.completed_questions.through
+    completed = set(through.objects.filter(chapterprogress_id=progress.pk).values_list('question_id', flat=True))
+    new_ids = [question_id for question_id in dict.fromkeys(question_ids) if question_id not in completed]
+    if not new_ids:
+        return 0
+
+    through.objects.bulk_create(
+        [through(chapterprogress_id=progress.pk, question_id=question_id) for question_id in new_ids],
+        ignore_conflicts=True,
+    )
+    refresh_chapter_progress(ChapterProgress.objects.filter(pk=progress.pk))
+    return len(new_ids)
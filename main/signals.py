@@ -1,8 +1,13 @@
 # signals.py
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, post_delete, m2m_changed
 from django.dispatch import receiver
 from django.contrib.auth.models import User
-from .models import Profile, UserEvaluation
+from .models import Profile, UserEvaluation, HomePage, Chapter, Lesson, LessonContent, Glossary, GuidesSupport, GuideSupportContent, GuidesSupportGlossary, Question, QuestionOption, LessonProgress, ChapterProgress
+from .content_cache import bump_content_version
+from .changelog import SYNC_MODELS, record_change
+from .progress import refresh_lesson_progress, refresh_chapter_progress, refresh_on_commit
+from .evaluation import refresh_practice_totals
 
 @receiver(post_save, sender=User)
 def create_profile(sender, instance, created, **kwargs):
@@ -18,7 +23,129 @@ def create_user_evaluation(sender, instance, created, **kwargs):
         UserEvaluation.objects.create(
             user=instance,             
             PracticeCompleted="0",      
-            QuestionAnswered="0",
-            CorrectAnswered="0",
-            WrongAnswered="0",    
         )
+
+@receiver([post_save, post_delete], sender=HomePage)
+@receiver([post_save, post_delete], sender=Chapter)
+@receiver([post_save, post_delete], sender=Lesson)
+@receiver([post_save, post_delete], sender=LessonContent)
+@receiver([post_save, post_delete], sender=Glossary)
+@receiver([post_save, post_delete], sender=GuidesSupport)
+@receiver([post_save, post_delete], sender=GuideSupportContent)
+@receiver([post_save, post_delete], sender=GuidesSupportGlossary)
+@receiver([post_save, post_delete], sender=Question)
+@receiver([post_save, post_delete], sender=QuestionOption)
+def content_changed(sender, instance, **kwargs):
+    """
+    Study content was edited: move the content cache to a new version
+    once the change is committed, so no reader caches the old rows under it.
+    """
+    transaction.on_commit(bump_content_version)
+
+
+def log_content_saved(sender, instance, created, raw=False, **kwargs):
+    if not raw:
+        record_change(instance, "insert" if created else "update")
+
+
+def log_content_deleted(sender, instance, **kwargs):
+    record_change(instance, "delete")
+
+
+for model in SYNC_MODELS:
+    post_save.connect(log_content_saved, sender=model, dispatch_uid=f"changelog-save-{model._meta.label}")
+    post_delete.connect(log_content_deleted, sender=model, dispatch_uid=f"changelog-delete-{model._meta.label}")
+
+
+@receiver(m2m_changed, sender=LessonProgress.completed_contents.through)
+def lesson_progress_contents_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    if not reverse:
+        progress = LessonProgress.objects.filter(pk=instance.pk)
+    elif pk_set is not None:
+        progress = LessonProgress.objects.filter(pk__in=pk_set)
+    else:
+        progress = LessonProgress.objects.filter(lesson_id=instance.lesson_id)
+    refresh_lesson_progress(progress)
+
+
+@receiver(m2m_changed, sender=ChapterProgress.completed_questions.through)
+def chapter_progress_questions_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    if not reverse:
+        progress = ChapterProgress.objects.filter(pk=instance.pk)
+    elif pk_set is not None:
+        progress = ChapterProgress.objects.filter(pk__in=pk_set)
+    else:
+        progress = ChapterProgress.objects.filter(chapter_id=instance.chapter_id)
+    refresh_chapter_progress(progress)
+
+
+@receiver(pre_save, sender=LessonContent)
+def lesson_content_saving(sender, instance, raw=False, **kwargs):
+    # The lesson before the save, to recount both sides of a move
+    instance._previous_lesson_id = None
+    if not raw and instance.pk is not None:
+        instance._previous_lesson_id = LessonContent.objects.filter(pk=instance.pk).values_list('lesson_id', flat=True).first()
+
+
+@receiver(post_save, sender=LessonContent)
+@receiver(post_delete, sender=LessonContent)
+def lesson_total_changed(sender, instance, created=True, raw=False, **kwargs):
+    """
+    A content was added, removed or moved to another lesson: recount the
+    progress rows of the lessons involved once the transaction commits.
+    """
+    if raw:
+        return
+    previous = getattr(instance, '_previous_lesson_id', None)
+    if created:
+        refresh_on_commit(lesson_ids=[instance.lesson_id])
+    elif previous is not None and previous != instance.lesson_id:
+        refresh_on_commit(lesson_ids=[previous, instance.lesson_id])
+
+
+@receiver(pre_save, sender=Question)
+def question_saving(sender, instance, raw=False, **kwargs):
+    # Chapter and type before the save; only they change the practice totals
+    instance._previous_state = None
+    if not raw and instance.pk is not None:
+        instance._previous_state = Question.objects.filter(pk=instance.pk).values_list('chapter_id', 'type').first()
+
+
+@receiver(post_save, sender=Question)
+@receiver(post_delete, sender=Question)
+def chapter_total_changed(sender, instance, created=True, raw=False, **kwargs):
+    """
+    A practice question was added, removed, moved to another chapter or
+    changed type: recount the progress rows of the chapters involved once
+    the transaction commits. Other edits recount nothing.
+    """
+    if raw:
+        return
+    previous = getattr(instance, '_previous_state', None)
+    current = (instance.chapter_id, instance.type)
+    if created or previous is None:
+        changed = [current]
+    elif previous != current:
+        changed = [previous, current]
+    else:
+        return
+    refresh_on_commit(chapter_ids=[chapter_id for chapter_id, question_type in changed if question_type == "practice"])
+
+
+@receiver(post_save, sender=ChapterProgress)
+def chapter_progress_created(sender, instance, created, raw=False, **kwargs):
+    """
+    Fill in the counters of a new row; that also adds it to the user's
+    practice totals.
+    """
+    if created and not raw:
+        refresh_chapter_progress(ChapterProgress.objects.filter(pk=instance.pk))
+
+
+@receiver(post_delete, sender=ChapterProgress)
+def chapter_progress_deleted(sender, instance, **kwargs):
+    refresh_practice_totals([instance.user_id])
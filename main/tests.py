@@ -1,3 +1,155 @@
-from django.test import TestCase
+from io import StringIO
+
+from django.test import TestCase, override_settings
+from django.core.cache import cache
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import CommandError
+
+from .models import Chapter, Lesson, LessonContent, LessonProgress, Question, ChapterProgress, UserEvaluation, ContentVersion
+from .evaluation import add_to_evaluation
+from .progress import _run_pending_refreshes
+from .content_cache import get_content_version, get_content_last_modified, CONTENT_VERSION_KEY
+
+User = get_user_model()
+
+
+@override_settings(LESSON_SNAPSHOT_ASYNC=False)
+class ProgressCounterTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="student", email="student@example.com", password="pass")
+        self.chapter = Chapter.objects.create(name="History")
+        self.lesson = Lesson.objects.create(name="1", title="Tudors", chapter=self.chapter)
+        self.contents = [LessonContent.objects.create(lesson=self.lesson, description=f"Part {i}") for i in range(4)]
+        self.questions = [Question.objects.create(chapter=self.chapter, question_text=f"Q{i}", type="practice") for i in range(2)]
+        Question.objects.create(chapter=self.chapter, question_text="Mock", type="freeMockTest")
+
+    def test_lesson_counters_follow_m2m_and_content_changes(self):
+        progress = LessonProgress.objects.create(user=self.user, lesson=self.lesson)
+        progress.completed_contents.add(*self.contents[:2])
+        progress.update_completion()
+        self.assertEqual((progress.completed_count, progress.total_count, progress.completion_percentage), (2, 4, 50.0))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.contents[3].delete()
+            LessonContent.objects.create(lesson=self.lesson, description="Extra")
+            LessonContent.objects.create(lesson=self.lesson, description="Extra")
+        progress.update_completion()
+        self.assertEqual((progress.completed_count, progress.total_count), (2, 5))
+
+        self.contents[0].lessonprogress_set.clear()
+        progress.update_completion()
+        self.assertEqual((progress.completed_count, progress.completion_percentage), (1, 20.0))
+
+    def test_chapter_counters_only_count_practice_questions(self):
+        progress = ChapterProgress.objects.create(user=self.user, chapter=self.chapter)
+        progress.completed_questions.add(*Question.objects.all())
+        progress.update_completion()
+        self.assertEqual((progress.completed_count, progress.total_count, progress.completion_percentage), (2, 2, 100.0))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Question.objects.create(chapter=self.chapter, question_text="Q2", type="practice")
+        progress.update_completion()
+        self.assertAlmostEqual(progress.completion_percentage, 2 / 3 * 100)
+
+    def test_only_relevant_question_changes_recount_once_per_transaction(self):
+        progress = ChapterProgress.objects.create(user=self.user, chapter=self.chapter)
+        progress.completed_questions.add(self.questions[0])
+
+        # A text edit queues no recount
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.questions[0].question_text = "Edited"
+            self.questions[0].save()
+        self.assertNotIn(_run_pending_refreshes, callbacks)
+
+        # An import of many questions recounts the chapter once, on commit
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            for i in range(20):
+                Question.objects.create(chapter=self.chapter, question_text=f"New {i}", type="practice")
+            progress.update_completion()
+            self.assertEqual(progress.total_count, 2)
+        progress.update_completion()
+        self.assertEqual((progress.completed_count, progress.total_count), (1, 22))
+
+    def test_moves_recount_both_parents(self):
+        other_chapter = Chapter.objects.create(name="Civics")
+        other_lesson = Lesson.objects.create(name="2", title="Parliament", chapter=other_chapter)
+        lesson_progress = LessonProgress.objects.create(user=self.user, lesson=self.lesson)
+        lesson_progress.completed_contents.add(self.contents[0])
+        chapter_progress = ChapterProgress.objects.create(user=self.user, chapter=self.chapter)
+        chapter_progress.completed_questions.add(self.questions[0])
+        moved_progress = ChapterProgress.objects.create(user=self.user, chapter=other_chapter)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.contents[0].lesson = other_lesson
+            self.contents[0].save()
+            self.questions[0].chapter = other_chapter
+            self.questions[0].save()
+
+        lesson_progress.update_completion()
+        self.assertEqual((lesson_progress.completed_count, lesson_progress.total_count), (0, 3))
+        chapter_progress.update_completion()
+        self.assertEqual((chapter_progress.completed_count, chapter_progress.total_count), (0, 1))
+        moved_progress.update_completion()
+        self.assertEqual(moved_progress.total_count, 1)
+
+    def test_rebuild_command_checks_and_repairs(self):
+        progress = LessonProgress.objects.create(user=self.user, lesson=self.lesson)
+        progress.completed_contents.add(self.contents[0])
+        LessonProgress.objects.update(completed_count=0, total_count=0)
+        UserEvaluation.objects.update(practice_chapter_count=5)
+
+        with self.assertRaises(CommandError):
+            call_command("rebuild_progress_counters", "--check", stdout=StringIO())
+
+        call_command("rebuild_progress_counters", stdout=StringIO())
+        call_command("rebuild_progress_counters", "--check", stdout=StringIO())
+        progress.refresh_from_db()
+        self.assertEqual((progress.completed_count, progress.total_count, progress.completion_percentage), (1, 4, 25.0))
+        self.assertEqual(UserEvaluation.objects.get().practice_chapter_count, 0)
+
+
+class EvaluationCounterTests(TestCase):
+    def test_counters_are_incremented_in_place(self):
+        user = User.objects.create_user(username="student", email="student@example.com", password="pass")
+        stale = UserEvaluation.objects.get(user__user=user)
+
+        with self.assertNumQueries(1):
+            add_to_evaluation(user, QuestionAnswered=24, CorrectAnswered=20, WrongAnswered=4)
+        add_to_evaluation(user, QuestionAnswered=24, CorrectAnswered=12, WrongAnswered=12)
+        # A stale copy saved elsewhere does not touch the counters it did not load
+        stale.save(update_fields=['LeftMockTest'])
+
+        evaluation = UserEvaluation.objects.get(user__user=user)
+        self.assertEqual((evaluation.QuestionAnswered, evaluation.CorrectAnswered, evaluation.WrongAnswered), (48, 32, 16))
+
+        UserEvaluation.objects.all().delete()
+        add_to_evaluation(user, MockTestTaken=1)
+        self.assertEqual(UserEvaluation.objects.get(user__user=user).MockTestTaken, 1)
+
+
+class ContentVersionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_edits_bump_the_shared_version(self):
+        before = get_content_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            Chapter.objects.create(name="History")
+        after = get_content_version()
+        self.assertGreater(after, before)
+        self.assertEqual(ContentVersion.objects.get().version, after)
+        self.assertEqual(get_content_last_modified(), ContentVersion.objects.get().modified)
+
+    @override_settings(CONTENT_VERSION_TTL=60)
+    def test_other_processes_edits_are_seen_once_the_memo_expires(self):
+        version = get_content_version()
+        with self.assertNumQueries(0):
+            get_content_version()
+
+        # An edit made by another worker or a management command
+        ContentVersion.objects.update(version=version + 1)
+        self.assertEqual(get_content_version(), version)
+        cache.delete(CONTENT_VERSION_KEY)
+        self.assertEqual(get_content_version(), version + 1)
 
-# Create your tests here.